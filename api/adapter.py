@@ -1,8 +1,21 @@
 from allauth.socialaccount.adapter import DefaultSocialAccountAdapter
 
+from wca.api import cache_avatar
+
 
 class SocialAccountAdapter(DefaultSocialAccountAdapter):
+    def pre_social_login(self, request, sociallogin):
+        super().pre_social_login(request, sociallogin)
+        if sociallogin.is_existing and sociallogin.user.wca_id:
+            cache_avatar(sociallogin.user.wca_id, sociallogin.account.extra_data)
+
     def populate_user(self, request, sociallogin, data):
         user = super().populate_user(request, sociallogin, data)
         user.wca_id = data.get("wca_id")
         return user
+
+    def save_user(self, request, sociallogin, form=None):
+        user = super().save_user(request, sociallogin, form=form)
+        if user.wca_id:
+            cache_avatar(user.wca_id, sociallogin.account.extra_data)
+        return user
@@ -19,3 +19,12 @@ FB_PAGE_ID = getattr(settings, "FB_PAGE_ID", os.getenv("FB_PAGE_ID"))
 FB_PAGE_FEED_LIMIT = getattr(
     settings, "FB_PAGE_FEED_LIMIT", os.getenv("FB_PAGE_FEED_LIMIT", 5)
 )
+
+# Ranking lists of at least this many rows are streamed in chunks
+RANKING_STREAMING_MIN_ROWS = int(
+    getattr(
+        settings,
+        "RANKING_STREAMING_MIN_ROWS",
+        os.getenv("RANKING_STREAMING_MIN_ROWS", 1000),
+    )
+)
@@ -0,0 +1,66 @@
+import logging
+
+from allauth.socialaccount.models import SocialAccount
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+from api.utils import WCA_PROVIDER, get_region_wca_ids
+from wca.events import get_event_info
+from wca.management.commands import benchmark
+from wca.rankings import RankingQuery
+from wca.serializers import RankingSerializer
+
+log = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class Command(benchmark.Command):
+    help = (
+        "Benchmark the hot code paths of the API against the synthetic dataset "
+        "of the wca benchmark, with a quarter of the persons signed up."
+    )
+    targets = ("region_rankings", "rendering")
+
+    def create_dataset(self, person_count, result_count):
+        super().create_dataset(person_count, result_count)
+
+        # A quarter of the persons signed up, spread over the regions
+        members = self.person_ids[: person_count // 4]
+        regions = [region for region, _ in User.REGION_CHOICES]
+        users = User.objects.bulk_create(
+            User(
+                username=f"benchmark-{wca_id}",
+                wca_id=wca_id,
+                region=regions[number % len(regions)],
+            )
+            for number, wca_id in enumerate(members)
+        )
+        SocialAccount.objects.bulk_create(
+            SocialAccount(user=user, provider=WCA_PROVIDER, uid=f"benchmark-{user.id}")
+            for user in users
+        )
+        self.analyze([User, SocialAccount])
+
+    def benchmark_region_rankings(self):
+        person_ids = User.objects.filter(
+            region=User.REGION_NCR,
+            socialaccount__provider=WCA_PROVIDER,
+            wca_id__isnull=False,
+        ).values_list("wca_id")
+        wca_ids = get_region_wca_ids([User.REGION_NCR])
+        self.compare_rankings("region", person_ids, wca_ids)
+
+    def benchmark_rendering(self):
+        event = max(self.events, key=lambda event: event.id)
+        rows = list(RankingQuery(event, "best").values()[:1000])
+        data = RankingSerializer(rows, get_event_info(event.id), "best").data
+        size = len(JSONRenderer().render(data)) / 1024
+        log.info(f"Rendering a ranking of 1000 results ({size:.0f} KiB)")
+        self.run_case("JSONRenderer", lambda: JSONRenderer().render(data))
+        self.run_case("ORJSONRenderer", lambda: ORJSONRenderer().render(data))
+        self.run_case(
+            "ORJSONRenderer stream",
+            lambda: list(ORJSONRenderer().render_stream(data)),
+        )
@@ -0,0 +1,135 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from wca.api import get_most_viewed_persons
+from wca.models import Event, PersonCareerStats
+
+log = logging.getLogger(__name__)
+
+User = get_user_model()
+
+RANKINGS = ("single", "average")
+
+
+class Command(BaseCommand):
+    help = "Pre-render ranking and profile responses into the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of responses to render in parallel.",
+        )
+        parser.add_argument(
+            "--persons",
+            type=int,
+            default=100,
+            help="Number of most-viewed person profiles to render.",
+        )
+
+    def handle(self, *args, **options):
+        if options["jobs"] < 1:
+            raise CommandError("--jobs must be at least 1.")
+        start = time.monotonic()
+        self.event_ids = list(
+            Event.objects.order_by("rank").values_list("id", flat=True)
+        )
+        groups = {
+            "national rankings": self.get_national_ranking_urls(),
+            "zonal rankings": self.get_zonal_ranking_urls(),
+            "regional rankings": self.get_regional_ranking_urls(),
+            "persons": self.get_person_urls(options["persons"]),
+        }
+
+        jobs = options["jobs"]
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for group, urls in groups.items():
+                group_start = time.monotonic()
+                if jobs > 1:
+                    timings = list(
+                        executor.map(lambda url: self.render(url, threaded=True), urls)
+                    )
+                else:
+                    timings = [self.render(url) for url in urls]
+                slowest = max(timings, default=0)
+                log.info(
+                    f"  {group}: {len(urls)} responses in "
+                    f"{time.monotonic() - group_start:.2f}s (slowest {slowest:.3f}s)"
+                )
+
+        log.info(f"Caches warmed! ({time.monotonic() - start:.2f}s)")
+
+    def get_national_ranking_urls(self):
+        return [
+            reverse(f"api:national-{ranking}-ranking", kwargs={"event_id": event_id})
+            for event_id in self.event_ids
+            for ranking in RANKINGS
+        ]
+
+    def get_zonal_ranking_urls(self):
+        return [
+            reverse(
+                f"api:zonal-{ranking}-ranking",
+                kwargs={"zone_id": zone_id, "event_id": event_id},
+            )
+            for zone_id, _ in User.ZONE_CHOICES
+            for event_id in self.event_ids
+            for ranking in RANKINGS
+        ]
+
+    def get_regional_ranking_urls(self):
+        return [
+            reverse(
+                f"api:regional-{ranking}-ranking",
+                kwargs={"region_id": region_id, "event_id": event_id},
+            )
+            for region_id, _ in User.REGION_CHOICES
+            for event_id in self.event_ids
+            for ranking in RANKINGS
+        ]
+
+    def get_person_urls(self, count):
+        """
+        Profiles of the most-viewed persons, topped up with the persons who
+        competed the most when there are not enough recorded views.
+        """
+        wca_ids = get_most_viewed_persons(count)
+        if len(wca_ids) < count:
+            wca_ids += (
+                PersonCareerStats.objects.exclude(person_id__in=wca_ids)
+                .order_by("-competition_count", "person_id")
+                .values_list("person_id", flat=True)[: count - len(wca_ids)]
+            )
+        return [
+            reverse("api:person-retrieve", kwargs={"wca_id": wca_id})
+            for wca_id in wca_ids
+        ]
+
+    def render(self, url, threaded=False):
+        start = time.monotonic()
+        try:
+            match = resolve(url)
+            request = RequestFactory().get(url)
+            request.resolver_match = match
+            # Not a visitor, so it does not count as a profile view
+            request.is_cache_warming = True
+            response = match.func(request, *match.args, **match.kwargs)
+            if response.status_code != 200:
+                log.warning(f"  {url}: {response.status_code}")
+        except Exception:
+            # A response that fails to render is only left cold, so that the
+            # import warming the caches still succeeds
+            log.exception(f"  {url}: failed")
+        finally:
+            if threaded:
+                connection.close()
+        return time.monotonic() - start
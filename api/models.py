@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
-from django_lifecycle import LifecycleModel, hook, AFTER_UPDATE
+from django_lifecycle import LifecycleModel, LifecycleModelMixin, hook, AFTER_UPDATE
+
+from wca.api import bump_members_version
 
 
 class BaseModel(models.Model):
@@ -12,7 +14,7 @@ class BaseModel(models.Model):
         abstract = True
 
 
-class User(AbstractUser):
+class User(LifecycleModelMixin, AbstractUser):
     REGION_NCR = "NCR"
     REGION_CAR = "CAR"
     REGION_1 = "01"
@@ -93,6 +95,12 @@ class User(AbstractUser):
             return f"{self.wca_id} - {self.get_full_name()}"
         return self.get_full_name()
 
+    @hook(AFTER_UPDATE, when_any=["region", "wca_id"], has_changed=True)
+    def on_region_change(self):
+        # Region memberships and the rankings of regions are cached per
+        # members version
+        bump_members_version()
+
 
 class RegionUpdateRequest(LifecycleModel):
     STATUS_PENDING = "p"
@@ -143,6 +143,19 @@ wca_result_list_example = OpenApiExample(
     response_only=True,
 )
 
+wca_scramble_list_example = OpenApiExample(
+    "Scramble list example",
+    value=[
+        {
+            "group_id": "A",
+            "is_extra": 0,
+            "scramble_num": 1,
+            "scramble": "F2 D' B2 U2 F2 R2 U' L2 D' R2 B' L' D' R B2 L2 U' F U2",
+        }
+    ],
+    response_only=True,
+)
+
 
 class CustomAutoSchema(AutoSchema):
     def get_summary(self):
@@ -289,6 +302,12 @@ class PersonRetrieveAPIView(OpenApiViewExamplesExtension):
     method = "get"
 
 
+class ScrambleListAPIViewExtension(OpenApiViewExamplesExtension):
+    target_class = "api.views.ScrambleListAPIView"
+    examples = [wca_scramble_list_example]
+    method = "get"
+
+
 class NewsListAPIViewExtension(OpenApiViewExamplesExtension):
     target_class = "api.views.NewsListAPIView"
     examples = [news_list_example]
@@ -0,0 +1,137 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RankingCursorPagination(BasePagination):
+    """
+    Keyset pagination over a ``RankingQuery``, ordered by its ``ordering``:
+    the ranked value, or the rank derived from it, and the result id.
+
+    The cursor holds the position of the last row of the previous page. The
+    national rankings are read with an index range scan starting from that
+    position, however deep it is. The zonal and regional rankings still pick
+    the best result of each person from every result of the event, but only
+    rank the rows after the position, continuing from the rank and row
+    number in the cursor. Pagination is opt-in with ``page_size`` or
+    ``cursor``, so plain ranking requests keep returning a list.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    default_page_size = 100
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if self.page_size is None:
+            return None
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ("1", "true"):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        if cursor:
+            try:
+                queryset = queryset.after(cursor)
+            except ValueError:
+                raise exceptions.ParseError("Invalid cursor")
+
+        results = list(queryset[: self.page_size + 1])
+        self.next_position = None
+        if len(results) > self.page_size:
+            results = results[: self.page_size]
+            self.next_position = queryset.get_position(results[-1])
+        return results
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            if self.cursor_query_param not in request.query_params:
+                return None
+            return self.default_page_size
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise exceptions.ParseError("Invalid page size")
+        if page_size < 1:
+            raise exceptions.ParseError("Invalid page size")
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return tuple(int(field) for field in position)
+        except ValueError:
+            raise exceptions.ParseError("Invalid cursor")
+
+    def encode_cursor(self, position):
+        position = ":".join(str(field) for field in position)
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def get_next_link(self):
+        """
+        Link relative to the host, since paginated responses are cached for
+        every host and scheme. The view makes it absolute per request.
+        """
+        if self.next_position is None:
+            return None
+        url = self.request.get_full_path()
+        url = replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+        return replace_query_param(url, self.page_size_query_param, self.page_size)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"next": self.get_next_link(), "count": self.count, "results": data}
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "oneOf": [
+                schema,
+                {
+                    "type": "object",
+                    "properties": {
+                        "next": {"type": "string", "nullable": True, "format": "uri"},
+                        "count": {"type": "integer", "nullable": True},
+                        "results": schema,
+                    },
+                },
+            ]
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Returns pages of this size with a next cursor.",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor of the page, from the next link.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Includes the total count in a paginated response.",
+                "schema": {"type": "boolean"},
+            },
+        ]
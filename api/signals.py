@@ -0,0 +1,21 @@
+from allauth.socialaccount.models import SocialAccount
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wca.api import bump_members_version, clear_avatar
+
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def clear_social_account_avatar(sender, instance, **kwargs):
+    """ Drop the cached avatar whenever the account's extra_data may change """
+    if instance.user.wca_id:
+        clear_avatar(instance.user.wca_id)
+
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def update_region_members(sender, instance, created=True, **kwargs):
+    """ Only WCA accounts are region members, so linking one changes rankings """
+    if created and instance.user.wca_id:
+        bump_members_version()
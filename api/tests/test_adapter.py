@@ -0,0 +1,17 @@
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.cache import cache
+
+from api.adapter import SocialAccountAdapter
+from wca.api import get_avatar_cache_key
+
+
+@pytest.mark.django_db
+def test_social_login_caches_avatar(user, locmem_cache):
+    sociallogin = MagicMock(is_existing=True, user=user)
+    sociallogin.account.extra_data = {"avatar": {"url": "avatar.png"}}
+
+    SocialAccountAdapter().pre_social_login(MagicMock(), sociallogin)
+
+    assert cache.get(get_avatar_cache_key(user.wca_id)) == {"url": "avatar.png"}
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from api import app_settings
+from api.renderers import ORJSONRenderer
+
+DATA = [
+    {
+        "name": "Juan dela Cruz ñ 日本",
+        "separators": "line\u2028paragraph\u2029",
+        "nested": {"list": [1, 2.5, None, True], 3: "int key"},
+        "datetime": datetime.datetime(2021, 4, 24, 3, 14, 50, 69000),
+        "utc": datetime.datetime(2021, 4, 24, tzinfo=datetime.timezone.utc),
+        "date": datetime.date(2021, 4, 24),
+        "decimal": decimal.Decimal("1.50"),
+        "uuid": uuid.UUID(int=1),
+        "lazy": gettext_lazy("Final"),
+    }
+] * 3
+
+
+@pytest.mark.parametrize("data", [DATA, DATA[0], [], None])
+def test_orjson_renderer_output(data):
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.parametrize("rows", [DATA, DATA[:1], []])
+def test_orjson_renderer_stream(rows):
+    renderer = ORJSONRenderer()
+    renderer.stream_chunk_size = 2
+    assert b"".join(renderer.render_stream(rows)) == JSONRenderer().render(rows)
+
+
+def test_orjson_renderer_indent():
+    media_type = "application/json; indent=4"
+    assert ORJSONRenderer().render(DATA, media_type) == JSONRenderer().render(
+        DATA, media_type
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "view_name, renderer_class",
+    [
+        ("api:event-list", ORJSONRenderer),
+        ("api:national-single-ranking", ORJSONRenderer),
+        ("api:zone-list", JSONRenderer),
+    ],
+)
+def test_orjson_renderer_only_renders_lists(
+    api_client, event, view_name, renderer_class
+):
+    kwargs = {"event_id": event.id} if "ranking" in view_name else {}
+    response = api_client.get(reverse(view_name, kwargs=kwargs))
+    assert type(response.accepted_renderer) is renderer_class
+
+
+@pytest.mark.django_db
+def test_ranking_api_streams_large_lists(api_client, event, monkeypatch):
+    url = reverse("api:national-single-ranking", kwargs={"event_id": event.id})
+    response = api_client.get(url)
+    assert not response.streaming
+
+    monkeypatch.setattr(app_settings, "RANKING_STREAMING_MIN_ROWS", 0)
+    response = api_client.get(url)
+    assert response.streaming
+    assert response["Content-Type"] == "application/json"
+    assert b"".join(response.streaming_content) == b"[]"
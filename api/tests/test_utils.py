@@ -0,0 +1,39 @@
+import pytest
+from django.contrib.auth import get_user_model
+
+from api.models import RegionUpdateRequest
+from api.utils import get_region_members, get_region_wca_ids
+
+User = get_user_model()
+
+
+@pytest.fixture
+def member(user):
+    user.socialaccount_set.create(provider="worldcubeassociation", uid=user.wca_id)
+    return user
+
+
+@pytest.mark.django_db
+def test_region_members(member, locmem_cache, django_assert_num_queries):
+    User.objects.create(username="nowca", region=User.REGION_NCR)
+
+    with django_assert_num_queries(1):
+        assert get_region_members() == {User.REGION_NCR: {"2021DELA01"}}
+    with django_assert_num_queries(0):
+        assert get_region_wca_ids([User.REGION_NCR, User.REGION_4A]) == ["2021DELA01"]
+
+
+@pytest.mark.django_db
+def test_region_members_follow_region_updates(member, locmem_cache):
+    assert get_region_wca_ids([User.REGION_NCR]) == ["2021DELA01"]
+
+    request = RegionUpdateRequest.objects.create(user=member, region=User.REGION_4A)
+    request.status = RegionUpdateRequest.STATUS_APPROVED
+    request.save()
+
+    assert get_region_wca_ids([User.REGION_NCR]) == []
+    assert get_region_wca_ids([User.REGION_4A]) == ["2021DELA01"]
+
+    member.region = User.REGION_NCR
+    member.save()
+    assert get_region_wca_ids([User.REGION_NCR]) == ["2021DELA01"]
@@ -1,9 +1,26 @@
 from unittest.mock import MagicMock, patch
 
 import pytest
+from allauth.socialaccount.models import SocialAccount
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from api.models import RegionUpdateRequest
+from api.tests.factories import UserFactory
+from wca.api import (
+    bump_data_version,
+    bump_members_version,
+    get_data_version,
+    get_members_version,
+    set_export_date,
+)
+from wca.management.commands import import_wca_data
+from wca.models import Scramble
+from wca.tests.factories import PersonFactory, ResultFactory
+from wca.utils import compress_scramble
+
 User = get_user_model()
 
 
@@ -68,6 +85,192 @@ def test_national_ranking_average_api(api_client, event):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_ranking_api_caches_responses(
+    api_client, event, django_assert_num_queries, locmem_cache
+):
+    url = reverse("api:national-single-ranking", kwargs={"event_id": event.id})
+    response = api_client.get(url, {"limit": 10})
+
+    with django_assert_num_queries(0):
+        assert api_client.get(url, {"limit": 10}).json() == response.json()
+    with django_assert_num_queries(1):
+        api_client.get(url, {"limit": 20})
+
+    # The events are reloaded once for the new version
+    bump_data_version()
+    with django_assert_num_queries(3):
+        api_client.get(url, {"limit": 10})
+    with django_assert_num_queries(1):
+        api_client.get(url, {"limit": 20})
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "url_name,kwargs",
+    [
+        ("api:national-single-ranking", {}),
+        ("api:regional-single-ranking", {"region_id": User.REGION_NCR}),
+    ],
+)
+def test_ranking_api_cursor_pagination(
+    api_client, competition, event, url_name, kwargs
+):
+    for number, best in enumerate([700, 650, 650, 650, 800], start=1):
+        person = PersonFactory(id=f"2021TEST{number:02}", country=competition.country)
+        ResultFactory(competition=competition, event=event, best=best, person=person)
+        UserFactory(username=person.id, wca_id=person.id).socialaccount_set.create(
+            provider="worldcubeassociation", uid=person.id
+        )
+    import_wca_data.Command().build_national_rankings()
+
+    url = reverse(url_name, kwargs={"event_id": event.id, **kwargs})
+    response = api_client.get(url, {"page_size": 2, "count": "true"})
+    pages = [response.json()]
+    while pages[-1]["next"]:
+        pages.append(api_client.get(pages[-1]["next"]).json())
+
+    assert pages[0]["count"] == 5
+    assert [[result["value"] for result in page["results"]] for page in pages] == [
+        ["6.50", "6.50"],
+        ["6.50", "7.00"],
+        ["8.00"],
+    ]
+    assert pages[-1]["next"] is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "url_name,kwargs",
+    [
+        ("api:event-list", {}),
+        ("api:national-single-ranking", {"event_id": "333"}),
+        ("api:regional-single-ranking", {"event_id": "333", "region_id": "NCR"}),
+    ],
+)
+def test_conditional_get(
+    api_client, event, person, locmem_cache, django_assert_num_queries, url_name, kwargs
+):
+    set_export_date("2021-05-01T00:00:05Z")
+    url = reverse(url_name, kwargs=kwargs)
+    response = api_client.get(url)
+    assert response.status_code == 200
+    assert response.has_header("ETag") and response.has_header("Last-Modified")
+
+    with django_assert_num_queries(0):
+        etag_response = api_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        date_response = api_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+    assert etag_response.status_code == 304
+    assert date_response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_conditional_get_follows_region_members(api_client, event, locmem_cache):
+    set_export_date("2021-05-01")
+    url = reverse(
+        "api:zonal-single-ranking", kwargs={"event_id": event.id, "zone_id": "luzon"}
+    )
+    etag = api_client.get(url)["ETag"]
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    bump_members_version()
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_members_version_keeps_national_rankings(
+    api_client, event, django_assert_num_queries, locmem_cache
+):
+    set_export_date("2021-05-01")
+    url = reverse("api:national-single-ranking", kwargs={"event_id": event.id})
+    response = api_client.get(url)
+    zonal_url = reverse(
+        "api:zonal-single-ranking", kwargs={"event_id": event.id, "zone_id": "luzon"}
+    )
+    api_client.get(zonal_url)
+
+    bump_members_version()
+    with django_assert_num_queries(0):
+        assert api_client.get(url).json() == response.json()
+        assert (
+            api_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+        )
+    # Only the region members are reloaded
+    with django_assert_num_queries(1):
+        assert api_client.get(zonal_url).status_code == 200
+
+
+@pytest.mark.django_db
+def test_ranking_api_next_link_follows_host(
+    api_client, competition, event, locmem_cache
+):
+    for number, best in enumerate([700, 650, 800], start=1):
+        person = PersonFactory(id=f"2021TEST{number:02}", country=competition.country)
+        ResultFactory(competition=competition, event=event, best=best, person=person)
+    import_wca_data.Command().build_national_rankings()
+
+    url = reverse("api:national-single-ranking", kwargs={"event_id": event.id})
+    internal = api_client.get(url, {"page_size": 2}, HTTP_HOST="internal:8000")
+    public = api_client.get(
+        url, {"page_size": 2}, HTTP_HOST="api.example.com", secure=True
+    )
+
+    assert internal.json()["next"].startswith(f"http://internal:8000{url}?")
+    assert public.json()["next"].startswith(f"https://api.example.com{url}?")
+    assert public.json()["results"] == internal.json()["results"]
+
+
+@pytest.mark.django_db
+def test_conditional_get_person(
+    api_client, person, user, locmem_cache, django_assert_num_queries
+):
+    set_export_date("2021-05-01")
+    account = SocialAccount.objects.create(
+        user=user,
+        provider="worldcubeassociation",
+        uid="1",
+        extra_data={"wca_id": user.wca_id, "avatar": {"url": "old.png"}},
+    )
+    url = reverse("api:person-retrieve", kwargs={"wca_id": person.id})
+    etag = api_client.get(url)["ETag"]
+
+    with patch("api.views.record_person_view") as record_person_view:
+        with django_assert_num_queries(0):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    record_person_view.assert_called_once_with(person.id)
+
+    account.extra_data["avatar"] = {"url": "new.png"}
+    account.save()
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()["avatar"] == {"url": "new.png"}
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_ranking_api_invalid_cursor(api_client, event):
+    url = reverse("api:national-single-ranking", kwargs={"event_id": event.id})
+    response = api_client.get(url, {"cursor": "invalid"})
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_region_update_request_approval_bumps_members_version(
+    region_update_request, locmem_cache
+):
+    data_version = get_data_version()
+    version = get_members_version()
+    region_update_request.status = RegionUpdateRequest.STATUS_APPROVED
+    region_update_request.save()
+    assert get_members_version() == version + 1
+    assert get_data_version() == data_version
+
+
 @pytest.mark.django_db
 def test_regional_ranking_single_api(api_client, event):
     url = reverse(
@@ -108,6 +311,38 @@ def test_zonal_ranking_average_api(api_client, event):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_zonal_ranking_average_api_orders_by_average(
+    api_client, competition, event, round_type
+):
+    for wca_id, results in [
+        ("2021FAST01", [(500, 1200), (900, 1000)]),
+        ("2021SLOW01", [(800, 1100)]),
+    ]:
+        person = PersonFactory(id=wca_id, country=competition.country)
+        for best, average in results:
+            ResultFactory(
+                competition=competition,
+                event=event,
+                best=best,
+                average=average,
+                person=person,
+            )
+        UserFactory(
+            username=wca_id, wca_id=wca_id, region=User.REGION_NCR
+        ).socialaccount_set.create(provider="worldcubeassociation", uid=wca_id)
+
+    url = reverse(
+        "api:zonal-average-ranking",
+        kwargs={"event_id": event.id, "zone_id": User.ZONE_LUZON},
+    )
+    response = api_client.get(url)
+    assert [(result["wca_id"], result["value"]) for result in response.json()] == [
+        ("2021FAST01", "10.00"),
+        ("2021SLOW01", "11.00"),
+    ]
+
+
 @pytest.mark.django_db
 def test_zonal_ranking_with_invalid_zone(api_client, event):
     url = reverse(
@@ -156,6 +391,56 @@ def test_person_retrieve_api(api_client, person):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_person_retrieve_api_caches_avatar(api_client, person, user, locmem_cache):
+    account = SocialAccount.objects.create(
+        user=user,
+        provider="worldcubeassociation",
+        uid="1",
+        extra_data={"wca_id": user.wca_id, "avatar": {"url": "old.png"}},
+    )
+    url = reverse("api:person-retrieve", kwargs={"wca_id": person.id})
+    assert api_client.get(url).json()["avatar"] == {"url": "old.png"}
+
+    with CaptureQueriesContext(connection) as queries:
+        assert api_client.get(url).json()["avatar"] == {"url": "old.png"}
+    assert not any("socialaccount" in query["sql"] for query in queries)
+
+    account.extra_data["avatar"] = {"url": "new.png"}
+    account.save()
+    assert api_client.get(url).json()["avatar"] == {"url": "new.png"}
+
+
+@pytest.mark.django_db
+def test_scramble_list_api(api_client, competition, event, round_type):
+    for scramble_num, scramble in enumerate(["R U R' U'", "F2 D' B2"], start=1):
+        Scramble.objects.create(
+            scramble_id=scramble_num,
+            competition=competition,
+            event=event,
+            round_type=round_type,
+            group_id="A",
+            is_extra=0,
+            scramble_num=scramble_num,
+            scramble=compress_scramble(scramble),
+        )
+    url = reverse(
+        "api:scramble-list",
+        kwargs={
+            "competition_id": competition.id,
+            "event_id": event.id,
+            "round_type_id": round_type.id,
+        },
+    )
+    response = api_client.get(url)
+    assert response.status_code == 200
+    resp_data = response.json()
+    assert [scramble["scramble"] for scramble in resp_data] == [
+        "R U R' U'",
+        "F2 D' B2",
+    ]
+
+
 def test_news_list_api(api_client):
     posts = [
         {
@@ -0,0 +1,64 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+from api.management.commands import warm_caches
+from api.views import PersonRetrieveAPIView
+from wca.api import get_avatar_cache_key
+from wca.models import Person, PersonCareerStats
+
+
+@pytest.mark.django_db
+def test_warm_caches(
+    api_client, event, person, django_assert_num_queries, locmem_cache, caplog
+):
+    PersonCareerStats.objects.create(person=person, competition_count=3)
+    with caplog.at_level("INFO"):
+        call_command("warm_caches", "--persons", "10")
+
+    assert "national rankings: 2 responses" in caplog.text
+    assert "zonal rankings: 6 responses" in caplog.text
+    assert "regional rankings: 34 responses" in caplog.text
+    assert "persons: 1 responses" in caplog.text
+    assert locmem_cache.get(get_avatar_cache_key(person.id), "missing") is None
+
+    url = reverse(
+        "api:zonal-average-ranking", kwargs={"zone_id": "luzon", "event_id": event.id}
+    )
+    with django_assert_num_queries(0):
+        assert api_client.get(url).status_code == 200
+
+    url = reverse("api:person-retrieve", kwargs={"wca_id": person.id})
+    with django_assert_num_queries(0):
+        assert api_client.get(url).json()["career"]["competition_count"] == 3
+
+
+@pytest.mark.django_db
+def test_warm_caches_skips_failed_responses(person, monkeypatch, caplog):
+    # Viewed before, but no longer in the export
+    monkeypatch.setattr(
+        warm_caches, "get_most_viewed_persons", lambda count: ["2021GONE01"]
+    )
+    PersonCareerStats.objects.create(person=person, competition_count=3)
+    with caplog.at_level("INFO"):
+        call_command("warm_caches", "--persons", "2")
+
+    assert "/persons/2021GONE01/: 404" in caplog.text
+    assert "persons: 2 responses" in caplog.text
+
+    def get_object(self):
+        raise Person.MultipleObjectsReturned()
+
+    monkeypatch.setattr(PersonRetrieveAPIView, "get_object", get_object)
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        call_command("warm_caches", "--persons", "2")
+
+    assert f"/persons/{person.id}/: failed" in caplog.text
+    assert "Caches warmed!" in caplog.text
+
+
+def test_warm_caches_invalid_jobs():
+    with pytest.raises(CommandError, match="--jobs must be at least 1"):
+        call_command("warm_caches", "--jobs", "0")
@@ -51,5 +51,10 @@ urlpatterns = [
         views.PersonRetrieveAPIView.as_view(),
         name="person-retrieve",
     ),
+    path(
+        "scrambles/<str:competition_id>/<str:event_id>/<str:round_type_id>/",
+        views.ScrambleListAPIView.as_view(),
+        name="scramble-list",
+    ),
     path("news/", views.NewsListAPIView.as_view(), name="news-list"),
 ]
@@ -1,11 +1,69 @@
+import hashlib
+import json
 import logging
+from collections import defaultdict
 
 import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from wca.api import (
+    get_avatar,
+    get_export_date,
+    get_members_modified,
+    get_members_version,
+)
 
 from . import app_settings
 
 log = logging.getLogger(__name__)
 FB_GRAPH_URL = "https://graph.facebook.com/v10.0"
+WCA_PROVIDER = "worldcubeassociation"
+REGION_MEMBERS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# (members version, region members) of this process
+_region_members = (None, {})
+
+
+def get_export_etag(request, *args, **kwargs):
+    """ ETag of responses that only change with a new WCA export """
+    export_date = get_export_date()
+    if export_date is None:
+        return None
+    return f'W/"{export_date:%Y%m%d%H%M%S}"'
+
+
+def get_export_last_modified(request, *args, **kwargs):
+    return get_export_date()
+
+
+def get_members_etag(request, *args, **kwargs):
+    """ ETag of responses that also change with the region members """
+    export_date = get_export_date()
+    if export_date is None:
+        return None
+    return f'W/"{export_date:%Y%m%d%H%M%S}-{get_members_version()}"'
+
+
+def get_members_last_modified(request, *args, **kwargs):
+    export_date = get_export_date()
+    if export_date is None:
+        return None
+    return max(export_date, get_members_modified())
+
+
+def get_person_etag(request, *args, **kwargs):
+    """
+    ETag of person profiles, which also change with the avatar. Avatars are
+    updated on login without a new data version, so the avatar itself is
+    part of the tag.
+    """
+    export_date = get_export_date()
+    if export_date is None:
+        return None
+    avatar = json.dumps(get_avatar(kwargs.get("wca_id")), sort_keys=True)
+    avatar_hash = hashlib.md5(avatar.encode()).hexdigest()[:12]
+    return f'W/"{export_date:%Y%m%d%H%M%S}-{avatar_hash}"'
 
 
 def get_facebook_posts():
@@ -31,3 +89,42 @@ def get_facebook_posts():
             }
         )
     return posts
+
+
+def get_region_members() -> dict:
+    """
+    WCA ids of the members of each region, as frozensets, for the current
+    members version. They are kept in this process and in the shared cache,
+    and rebuilt with one query whenever the members version changes.
+    """
+    global _region_members
+    version = get_members_version()
+    cached_version, members = _region_members
+    if cached_version == version:
+        return members
+
+    key = f"api:region-members:{version}"
+    members = cache.get(key)
+    if members is None:
+        members = defaultdict(set)
+        rows = (
+            get_user_model()
+            .objects.filter(
+                region__isnull=False,
+                socialaccount__provider=WCA_PROVIDER,
+                wca_id__isnull=False,
+            )
+            .values_list("region", "wca_id")
+        )
+        for region, wca_id in rows:
+            members[region].add(wca_id)
+        members = {region: frozenset(ids) for region, ids in members.items()}
+        cache.set(key, members, timeout=REGION_MEMBERS_CACHE_TIMEOUT)
+    _region_members = (version, members)
+    return members
+
+
+def get_region_wca_ids(regions) -> list:
+    """ Sorted WCA ids of the members of any of the regions """
+    members = get_region_members()
+    return sorted(frozenset().union(*(members.get(region, ()) for region in regions)))
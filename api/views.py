@@ -1,21 +1,48 @@
+from urllib.parse import urlencode
+
 from allauth.socialaccount.providers.oauth2.client import OAuth2Client
 from dj_rest_auth.registration.views import SocialLoginView
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 from rest_framework import exceptions
-from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveAPIView
+from rest_framework.generics import (
+    ListAPIView,
+    ListCreateAPIView,
+    RetrieveAPIView,
+    get_object_or_404,
+)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from wca_allauth.views import WorldCubeAssociationOAuth2Adapter
 
-from wca.models import Event, Person, Result
-from wca.serializers import EventSerializer, PersonSerializer, ResultSerializer
+from wca.api import (
+    get_avatar,
+    get_data_version,
+    get_members_version,
+    record_person_view,
+)
+from wca.events import get_event_info
+from wca.models import Event, NationalRanking, Person, Scramble
+from wca.rankings import NationalRankingQuery, RankingQuery
+from wca.serializers import (
+    EventSerializer,
+    PersonSerializer,
+    RankingSerializer,
+    ResultSerializer,
+    ScrambleSerializer,
+)
 
 from . import app_settings
 from .filters import LimitFilter
+from .pagination import RankingCursorPagination
+from .renderers import ORJSONRenderer
 from .models import RegionUpdateRequest
 from .serializers import (
     NewsSerializer,
@@ -25,12 +52,34 @@ from .serializers import (
     WCALoginSerializer,
     ZoneSerializer,
 )
-from .utils import get_facebook_posts
+from .utils import (
+    get_export_etag,
+    get_export_last_modified,
+    get_facebook_posts,
+    get_members_etag,
+    get_members_last_modified,
+    get_person_etag,
+    get_region_wca_ids,
+)
 
 User = get_user_model()
 
-PH_COUNTRY_ID = "Philippines"
-WCA_PROVIDER = "worldcubeassociation"
+RANKING_CACHE_TIMEOUT = 60 * 60 * 24
+PERSON_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Answer conditional requests before any query, from the imported export date
+export_condition = method_decorator(
+    condition(etag_func=get_export_etag, last_modified_func=get_export_last_modified),
+    name="dispatch",
+)
+members_condition = method_decorator(
+    condition(etag_func=get_members_etag, last_modified_func=get_members_last_modified),
+    name="dispatch",
+)
+# Only an ETag, since avatar updates have no modification time
+person_condition = method_decorator(condition(etag_func=get_person_etag), name="get")
+# orjson renders the large lists, ahead of the default JSON renderer
+ORJSON_RENDERER_CLASSES = [ORJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
 
 
 class WCALoginView(SocialLoginView):
@@ -84,17 +133,89 @@ class ZoneListAPIView(APIView):
         return Response(zones)
 
 
+@export_condition
 class EventListAPIView(ListAPIView):
     """ List of official WCA events """
 
     serializer_class = EventSerializer
     queryset = Event.objects.order_by("rank")
+    renderer_classes = ORJSON_RENDERER_CLASSES
 
 
 class RankingBaseAPIView(ListAPIView):
     serializer_class = ResultSerializer
     filter_backends = [LimitFilter]
+    pagination_class = RankingCursorPagination
+    renderer_classes = ORJSON_RENDERER_CLASSES
+    ranking_class = RankingQuery
     rank_type = None
+    cache_query_params = ("limit", "page_size", "cursor", "count")
+
+    def get_queryset(self):
+        return self.ranking_class(self.get_event(), self.rank_type, self.get_wca_ids())
+
+    def filter_queryset(self, queryset):
+        if self.paginator.get_page_size(self.request) is not None:
+            # Pages replace the limit
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is None:
+            data = self.get_ranking_data()
+            cache.set(key, data, timeout=RANKING_CACHE_TIMEOUT)
+        if isinstance(data, dict) and data.get("next"):
+            data = {**data, "next": request.build_absolute_uri(data["next"])}
+
+        renderer = request.accepted_renderer
+        if (
+            isinstance(renderer, ORJSONRenderer)
+            and isinstance(data, list)
+            and len(data) >= app_settings.RANKING_STREAMING_MIN_ROWS
+        ):
+            return StreamingHttpResponse(
+                renderer.render_stream(data, request.accepted_media_type),
+                content_type=renderer.media_type,
+            )
+        return Response(data)
+
+    def get_ranking_data(self):
+        """
+        The ranking serialized from plain rows with ``RankingSerializer``,
+        in the same schema as ``serializer_class``.
+        """
+        rankings = self.get_queryset().values()
+        rows = self.filter_queryset(rankings)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            data = RankingSerializer(page, rankings.event, self.rank_type).data
+            return self.get_paginated_response(data).data
+        return RankingSerializer(rows, rankings.event, self.rank_type).data
+
+    def get_cache_key(self):
+        """
+        Key of the cached response, which is only reused for the same cache
+        version, so imports never serve stale rankings.
+        """
+        params = {"limit": LimitFilter.default_limit}
+        params.update(
+            (param, value)
+            for param, value in self.request.query_params.items()
+            if param in self.cache_query_params
+        )
+        kwargs = ":".join(
+            f"{key}={value}" for key, value in sorted(self.kwargs.items())
+        )
+        return (
+            f"rankings:{self.get_cache_version()}:"
+            f"{self.request.resolver_match.view_name}:"
+            f"{kwargs}:{urlencode(sorted(params.items()))}"
+        )
+
+    def get_cache_version(self):
+        return str(get_data_version())
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -102,56 +223,42 @@ class RankingBaseAPIView(ListAPIView):
         return context
 
     def get_event(self):
-        event_id = self.kwargs.get("event_id")
-        event = Event.objects.filter(pk=event_id).first()
+        event = get_event_info(self.kwargs.get("event_id"))
         if not event:
             raise exceptions.NotFound("Event not found.")
         return event
 
+    def get_wca_ids(self):
+        """ WCA ids of the persons ranked, or None for every person """
+        return None
 
-class NationalRankingSingleAPIView(RankingBaseAPIView):
-    """ Official single national rankings """
 
-    rank_type = "best"
+@export_condition
+class NationalRankingBaseAPIView(RankingBaseAPIView):
+    ranking_class = NationalRankingQuery
 
-    def get_queryset(self):
-        event = self.get_event()
-        result_ids = (
-            Result.objects.filter(country_id=PH_COUNTRY_ID, event=event, best__gt=0)
-            .order_by("person_id", "best")
-            .distinct("person_id")
-            .values_list("id")
-        )
-        results = (
-            Result.objects.filter(pk__in=result_ids)
-            .select_related("event", "person", "competition")
-            .order_by("best")
-        )
-        return results
+
+class NationalRankingSingleAPIView(NationalRankingBaseAPIView):
+    """ Official single national rankings """
+
+    rank_type = NationalRanking.RANK_TYPE_BEST
 
 
-class NationalRankingAverageAPIView(RankingBaseAPIView):
+class NationalRankingAverageAPIView(NationalRankingBaseAPIView):
     """ Official average national rankings """
 
-    rank_type = "average"
+    rank_type = NationalRanking.RANK_TYPE_AVERAGE
 
-    def get_queryset(self):
-        event = self.get_event()
-        result_ids = (
-            Result.objects.filter(country_id=PH_COUNTRY_ID, event=event, average__gt=0)
-            .order_by("person_id", "average")
-            .distinct("person_id")
-            .values_list("id")
-        )
-        results = (
-            Result.objects.filter(pk__in=result_ids)
-            .select_related("event", "person", "competition")
-            .order_by("average")
-        )
-        return results
 
+@members_condition
+class MembersRankingBaseAPIView(RankingBaseAPIView):
+    """ Rankings of region members, which also change with the members """
 
-class ZonalRankingBaseAPIView(RankingBaseAPIView):
+    def get_cache_version(self):
+        return f"{get_data_version()}-{get_members_version()}"
+
+
+class ZonalRankingBaseAPIView(MembersRankingBaseAPIView):
     def get_zone(self):
         valid_zones = [zone_id for zone_id, _ in User.ZONE_CHOICES]
         zone = self.kwargs.get("zone_id")
@@ -163,127 +270,36 @@ class ZonalRankingBaseAPIView(RankingBaseAPIView):
 
     def get_wca_ids(self):
         zone = self.get_zone()
-        zone_regions = User.ZONE_REGIONS.get(zone)
-        wca_ids = User.objects.filter(
-            region__in=zone_regions,
-            socialaccount__provider=WCA_PROVIDER,
-            wca_id__isnull=False,
-        ).values_list("wca_id")
-        return wca_ids
+        return get_region_wca_ids(User.ZONE_REGIONS.get(zone))
 
 
 class ZonalRankingSingleAPIView(ZonalRankingBaseAPIView):
     """ Unofficial single zonal rankings """
 
-    rank_type = "best"
-
-    def get_queryset(self):
-        event = self.get_event()
-        wca_ids = self.get_wca_ids()
-        result_ids = (
-            Result.objects.filter(
-                country_id=PH_COUNTRY_ID,
-                event=event,
-                best__gt=0,
-                person_id__in=wca_ids,
-            )
-            .order_by("person_id", "best")
-            .distinct("person_id")
-            .values_list("id")
-        )
-        results = (
-            Result.objects.filter(pk__in=result_ids)
-            .select_related("event", "person", "competition")
-            .order_by("best")
-        )
-        return results
+    rank_type = NationalRanking.RANK_TYPE_BEST
 
 
 class ZonalRankingAverageAPIView(ZonalRankingBaseAPIView):
     """ Unofficial average zonal rankings """
 
-    rank_type = "average"
+    rank_type = NationalRanking.RANK_TYPE_AVERAGE
 
-    def get_queryset(self):
-        event = self.get_event()
-        wca_ids = self.get_wca_ids()
-        result_ids = (
-            Result.objects.filter(
-                country_id=PH_COUNTRY_ID,
-                event=event,
-                average__gt=0,
-                person_id__in=wca_ids,
-            )
-            .order_by("person_id", "best")
-            .distinct("person_id")
-            .values_list("id")
-        )
-        results = (
-            Result.objects.filter(pk__in=result_ids)
-            .select_related("event", "person", "competition")
-            .order_by("best")
-        )
-        return results
+
+class RegionalRankingBaseAPIView(MembersRankingBaseAPIView):
+    def get_wca_ids(self):
+        return get_region_wca_ids([self.kwargs.get("region_id")])
 
 
-class RegionalRankingSingleAPIView(RankingBaseAPIView):
+class RegionalRankingSingleAPIView(RegionalRankingBaseAPIView):
     """ Unofficial single regional rankings """
 
-    rank_type = "best"
-
-    def get_queryset(self):
-        region = self.kwargs.get("region_id")
-        event = self.get_event()
-        wca_ids = User.objects.filter(
-            region=region, socialaccount__provider=WCA_PROVIDER, wca_id__isnull=False
-        ).values_list("wca_id")
-        result_ids = (
-            Result.objects.filter(
-                country_id=PH_COUNTRY_ID,
-                event=event,
-                best__gt=0,
-                person_id__in=wca_ids,
-            )
-            .order_by("person_id", "best")
-            .distinct("person_id")
-            .values_list("id")
-        )
-        results = (
-            Result.objects.filter(pk__in=result_ids)
-            .select_related("event", "person", "competition")
-            .order_by("best")
-        )
-        return results
+    rank_type = NationalRanking.RANK_TYPE_BEST
 
 
-class RegionalRankingAverageAPIView(RankingBaseAPIView):
+class RegionalRankingAverageAPIView(RegionalRankingBaseAPIView):
     """ Unofficial average regional rankings """
 
-    rank_type = "average"
-
-    def get_queryset(self):
-        region = self.kwargs.get("region_id")
-        event = self.get_event()
-        wca_ids = User.objects.filter(
-            region=region, socialaccount__provider=WCA_PROVIDER, wca_id__isnull=False
-        ).values_list("wca_id")
-        result_ids = (
-            Result.objects.filter(
-                country_id=PH_COUNTRY_ID,
-                event=event,
-                average__gt=0,
-                person_id__in=wca_ids,
-            )
-            .order_by("person_id", "average")
-            .distinct("person_id")
-            .values_list("id")
-        )
-        results = (
-            Result.objects.filter(pk__in=result_ids)
-            .select_related("event", "person", "competition")
-            .order_by("average")
-        )
-        return results
+    rank_type = NationalRanking.RANK_TYPE_AVERAGE
 
 
 class RegionUpdateRequestListCreateAPIView(ListCreateAPIView):
@@ -320,14 +336,47 @@ class RegionUpdateRequestListCreateAPIView(ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
+@person_condition
 class PersonRetrieveAPIView(RetrieveAPIView):
     """ Retrieve WCA profile and statistics """
 
     serializer_class = PersonSerializer
 
+    def dispatch(self, request, *args, **kwargs):
+        # Counted before the conditional check of ``get``, so that views
+        # answered with a 304 are counted as well
+        warming = getattr(request, "is_cache_warming", False)
+        if request.method in ("GET", "HEAD") and not warming:
+            record_person_view(kwargs.get("wca_id"))
+        return super().dispatch(request, *args, **kwargs)
+
     def get_object(self):
         wca_id = self.kwargs.get("wca_id")
-        return Person.objects.get(id=wca_id)
+        return get_object_or_404(Person, id=wca_id)
+
+    def retrieve(self, request, *args, **kwargs):
+        wca_id = self.kwargs.get("wca_id")
+        key = f"persons:{get_data_version()}:{wca_id}"
+        data = cache.get(key)
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            cache.set(key, data, timeout=PERSON_CACHE_TIMEOUT)
+        # The avatar is cached on its own, since it changes between imports
+        data = {**data, "avatar": get_avatar(wca_id)}
+        return Response(data)
+
+
+class ScrambleListAPIView(ListAPIView):
+    """ Official scrambles of a competition round """
+
+    serializer_class = ScrambleSerializer
+
+    def get_queryset(self):
+        return Scramble.objects.filter(
+            competition_id=self.kwargs.get("competition_id"),
+            event_id=self.kwargs.get("event_id"),
+            round_type_id=self.kwargs.get("round_type_id"),
+        ).order_by("group_id", "is_extra", "scramble_num")
 
 
 class NewsListAPIView(APIView):
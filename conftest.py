@@ -1,13 +1,18 @@
 import pytest
+from django.core.cache import cache
 from pytest_factoryboy import register
 from rest_framework.test import APIClient
 
+from api import utils as api_utils
 from api.tests.factories import RegionUpdateRequestFactory, UserFactory
+from wca import events
 from wca.tests.factories import (
+    CompetitionFactory,
     ContinentFactory,
     CountryFactory,
     EventFactory,
     PersonFactory,
+    RoundTypeFactory,
 )
 
 register(UserFactory, "user")
@@ -17,8 +22,28 @@ register(CountryFactory, "country")
 register(ContinentFactory, "continent")
 register(EventFactory, "event")
 register(PersonFactory, "person")
+register(RoundTypeFactory, "round_type")
+register(CompetitionFactory, "competition")
+
+
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    # Data versions fall back to timestamps without a shared cache, so the
+    # members and events of an earlier test could otherwise be reused
+    api_utils._region_members = (None, {})
+    events._events = (None, {})
 
 
 @pytest.fixture
 def api_client():
     return APIClient()
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    yield cache
+    cache.clear()
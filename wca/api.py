@@ -1,119 +1,193 @@
-from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+import datetime
+import time
+from typing import Optional
+
+from allauth.socialaccount.models import SocialAccount
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django_redis import get_redis_connection
+from wca_allauth.provider import WorldCubeAssociationProvider
 
 from . import utils
-from .models import Event, Person, RanksAverage, RanksSingle, Result
+from .models import ImportCheckpoint, Person, PersonCareerStats
+
+AVATAR_CACHE_TIMEOUT = 60 * 60 * 24
+DATA_VERSION_CACHE_KEY = "wca:data-version"
+EXPORT_DATE_CACHE_KEY = "wca:export-date"
+MEMBERS_VERSION_CACHE_KEY = "wca:members-version"
+MEMBERS_MODIFIED_CACHE_KEY = "wca:members-modified"
+PERSON_VIEWS_KEY = "wca:person-views"
+_missing = object()
+
+
+def _get_version(key: str) -> int:
+    return cache.get_or_set(key, lambda: int(time.time()), timeout=None)
+
+
+def _bump_version(key: str) -> int:
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Not set yet or evicted, start from a version that no cached
+        # response was stored under
+        version = int(time.time())
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_data_version() -> int:
+    """
+    Version of the ranking data, which changes whenever an import could
+    change a ranking.
+    """
+    return _get_version(DATA_VERSION_CACHE_KEY)
+
+
+def bump_data_version() -> int:
+    return _bump_version(DATA_VERSION_CACHE_KEY)
+
+
+def get_members_version() -> int:
+    """
+    Version of the region members, which changes whenever a WCA account is
+    linked or unlinked, or a user's region or WCA id changes.
+    """
+    return _get_version(MEMBERS_VERSION_CACHE_KEY)
+
+
+def bump_members_version() -> int:
+    cache.set(MEMBERS_MODIFIED_CACHE_KEY, time.time(), timeout=None)
+    return _bump_version(MEMBERS_VERSION_CACHE_KEY)
+
+
+def get_members_modified() -> datetime.datetime:
+    """ When the members version last changed """
+    modified = cache.get_or_set(MEMBERS_MODIFIED_CACHE_KEY, time.time, timeout=None)
+    return datetime.datetime.fromtimestamp(modified, tz=datetime.timezone.utc)
+
+
+def set_export_date(export_date: str):
+    cache.set(EXPORT_DATE_CACHE_KEY, export_date, timeout=None)
+
 
-User = get_user_model()
+def get_export_date() -> Optional[datetime.datetime]:
+    """
+    Date of the imported WCA export, read from the cache so that conditional
+    requests are answered without a database query.
+    """
+    export_date = cache.get(EXPORT_DATE_CACHE_KEY)
+    if export_date is None:
+        export_date = (
+            ImportCheckpoint.objects.exclude(export_date=None)
+            .order_by("-updated_at")
+            .values_list("export_date", flat=True)
+            .first()
+        )
+        # Also remember that nothing was imported yet
+        set_export_date(export_date or "")
+    if not export_date:
+        return None
 
+    parsed = parse_datetime(export_date)
+    if parsed is None:
+        date = parse_date(export_date)
+        if date is None:
+            return None
+        parsed = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
 
-def get_avatar(person: Person) -> dict:
-    user = (
-        User.objects.filter(wca_id=person.id).prefetch_related("socialaccount").first()
+
+def _get_redis_client():
+    try:
+        return get_redis_connection("default")
+    except NotImplementedError:
+        # The cache backend is not Redis, so there is nowhere to keep counts
+        return None
+
+
+def record_person_view(wca_id: str):
+    client = _get_redis_client()
+    if client:
+        client.zincrby(PERSON_VIEWS_KEY, 1, wca_id)
+
+
+def get_most_viewed_persons(count: int) -> list:
+    client = _get_redis_client()
+    if not client or count <= 0:
+        return []
+    return [
+        wca_id.decode() for wca_id in client.zrevrange(PERSON_VIEWS_KEY, 0, count - 1)
+    ]
+
+
+def get_avatar_cache_key(wca_id: str) -> str:
+    return f"wca:avatar:{wca_id}"
+
+
+def cache_avatar(wca_id: str, extra_data: dict):
+    cache.set(
+        get_avatar_cache_key(wca_id),
+        extra_data.get("avatar"),
+        timeout=AVATAR_CACHE_TIMEOUT,
     )
-    if user:
-        return user.socialaccount.extra_data.get("avatar")
 
 
-def get_competition_count(person: Person) -> int:
-    return Result.objects.filter(person=person).distinct("competition").count()
+def clear_avatar(wca_id: str):
+    cache.delete(get_avatar_cache_key(wca_id))
 
 
-def _get_ranks_result(rank, rank_type):
+def get_avatar(wca_id: str) -> dict:
+    avatar = cache.get(get_avatar_cache_key(wca_id), default=_missing)
+    if avatar is not _missing:
+        return avatar
+
+    extra_data = (
+        SocialAccount.objects.filter(
+            provider=WorldCubeAssociationProvider.id, user__wca_id=wca_id
+        )
+        .values_list("extra_data", flat=True)
+        .first()
+    )
+    cache_avatar(wca_id, extra_data or {})
+    return (extra_data or {}).get("avatar")
+
+
+def _get_ranks_result(rank, format, rank_type):
     return {
-        "best": utils.parse_value(rank.best, rank.event.format, rank_type=rank_type),
-        "world_rank": rank.world_rank,
-        "continent_rank": rank.continent_rank,
-        "country_rank": rank.country_rank,
+        "best": utils.parse_value(rank["best"], format, rank_type=rank_type),
+        "world_rank": rank["world_rank"],
+        "continent_rank": rank["continent_rank"],
+        "country_rank": rank["country_rank"],
     }
 
 
-def get_personal_records(person: Person) -> list:
+def get_personal_records(stats: PersonCareerStats) -> dict:
     records = {}
-    event_ids = Event.objects.values_list("id")
-    ranks_single = (
-        RanksSingle.objects.filter(person=person, event__in=event_ids)
-        .select_related("event")
-        .order_by("event__rank")
-        .distinct("event__rank")
-    )
-    ranks_average = (
-        RanksAverage.objects.filter(person=person, event__in=event_ids)
-        .select_related("event")
-        .order_by("event__rank")
-        .distinct("event__rank")
-    )
-
-    for single in ranks_single:
-        if single.event.id not in records:
-            records[single.event.id] = {
-                "single": _get_ranks_result(single, rank_type="single"),
-            }
-        else:
-            records[single.event.id]["single"] = _get_ranks_result(
-                single, rank_type="single"
-            )
-    for average in ranks_average:
-        if average.event.id not in records:
-            records[average.event.id] = {
-                "average": _get_ranks_result(average, rank_type="average"),
-            }
-        else:
-            records[average.event.id]["average"] = _get_ranks_result(
-                average, rank_type="average"
+    for record in stats.personal_records:
+        records[record["event_id"]] = {
+            rank_type: _get_ranks_result(
+                record[rank_type], record["format"], rank_type=rank_type
             )
+            for rank_type in ["single", "average"]
+            if record[rank_type]
+        }
     return records
 
 
 def get_career_details(person: Person) -> dict:
-    finals = dict(result__round_type__final=1, result__best__gt=0)
-    annotations = dict(
-        # Solve count
-        solves1=Count("result", filter=Q(result__value1__gt=0)),
-        solves2=Count("result", filter=Q(result__value2__gt=0)),
-        solves3=Count("result", filter=Q(result__value3__gt=0)),
-        solves4=Count("result", filter=Q(result__value4__gt=0)),
-        solves5=Count("result", filter=Q(result__value5__gt=0)),
-        # Records
-        nr_single=Count("result", filter=Q(result__regional_single_record="NR")),
-        nr_average=Count("result", filter=Q(result__regional_average_record="NR")),
-        wr_single=Count("result", filter=Q(result__regional_single_record="WR")),
-        wr_average=Count("result", filter=Q(result__regional_average_record="WR")),
-        continent_single=Count(
-            "result",
-            filter=Q(
-                ~Q(result__regional_single_record=None),
-                ~Q(result__regional_single_record__in=["NR", "WR"]),
-            ),
-        ),
-        continent_average=Count(
-            "result",
-            filter=Q(
-                ~Q(result__regional_average_record=None),
-                ~Q(result__regional_average_record__in=["NR", "WR"]),
-            ),
-        ),
-        # Medals
-        gold=Count("result", filter=Q(**finals, result__pos=1)),
-        silver=Count("result", filter=Q(**finals, result__pos=2)),
-        bronze=Count("result", filter=Q(**finals, result__pos=3)),
-    )
-    person = Person.objects.filter(id=person.id).annotate(**annotations).first()
-    national = person.nr_single + person.nr_average
-    world = person.wr_single + person.wr_average
-    continent = person.continent_single + person.continent_average
+    stats = PersonCareerStats.objects.filter(person_id=person.id).first()
+    if not stats:
+        stats = PersonCareerStats(person_id=person.id)
+    national = stats.national_records
+    world = stats.world_records
+    continent = stats.continental_records
     return {
-        "competition_count": get_competition_count(person),
-        "solve_count": sum(
-            [
-                person.solves1,
-                person.solves2,
-                person.solves3,
-                person.solves4,
-                person.solves5,
-            ]
-        ),
-        "personal_records": get_personal_records(person),
+        "competition_count": stats.competition_count,
+        "solve_count": stats.solve_count,
+        "personal_records": get_personal_records(stats),
         "records": {
             "national": national,
             "continental": continent,
@@ -121,9 +195,9 @@ def get_career_details(person: Person) -> dict:
             "total": national + continent + world,
         },
         "medals": {
-            "gold": person.gold,
-            "silver": person.silver,
-            "bronze": person.bronze,
-            "total": person.gold + person.silver + person.bronze,
+            "gold": stats.gold,
+            "silver": stats.silver,
+            "bronze": stats.bronze,
+            "total": stats.gold + stats.silver + stats.bronze,
         },
     }
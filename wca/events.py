@@ -0,0 +1,80 @@
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from .api import get_data_version
+from .models import Event, Format
+from .utils import Ao5_EVENTS, Mo3_EVENTS
+
+AVERAGE_OF_5_FORMAT_ID = "a"
+MEAN_OF_3_FORMAT_ID = "m"
+
+# (data version, events) of this process
+_events = (None, MappingProxyType({}))
+
+
+class EventInfo(NamedTuple):
+    """
+    What formatting needs to know about an event, so that results can be
+    formatted from their ``event_id`` alone, without loading the event.
+    """
+
+    id: str
+    format: str
+    ao5: bool
+    mo3: bool
+    format_id: Optional[str]
+    expected_solve_count: Optional[int]
+    trim_fastest_n: Optional[int]
+    trim_slowest_n: Optional[int]
+    # The event as serialized by EventSerializer, shared by every response
+    data: dict
+
+
+def get_events() -> Mapping[str, EventInfo]:
+    """
+    Read-only registry of the events by id, loaded with two queries once per
+    data version and then kept in this process.
+    """
+    global _events
+    version = get_data_version()
+    cached_version, events = _events
+    if cached_version != version:
+        events = MappingProxyType(load_events())
+        _events = (version, events)
+    return events
+
+
+def get_event_info(event_id: str) -> Optional[EventInfo]:
+    return get_events().get(event_id)
+
+
+def load_events() -> dict:
+    formats = Format.objects.in_bulk()
+    events = {}
+    for event in Event.objects.order_by("rank"):
+        ao5 = event.id in Ao5_EVENTS
+        mo3 = event.id in Mo3_EVENTS
+        format_id = None
+        if ao5:
+            format_id = AVERAGE_OF_5_FORMAT_ID
+        elif mo3:
+            format_id = MEAN_OF_3_FORMAT_ID
+        format = formats.get(format_id)
+        events[event.id] = EventInfo(
+            id=event.id,
+            format=event.format,
+            ao5=ao5,
+            mo3=mo3,
+            format_id=format_id,
+            expected_solve_count=format and format.expected_solve_count,
+            trim_fastest_n=format and format.trim_fastest_n,
+            trim_slowest_n=format and format.trim_slowest_n,
+            data={
+                "id": event.id,
+                "name": event.name,
+                "rank": event.rank,
+                "format": event.format,
+                "cell_name": event.cell_name,
+            },
+        )
+    return events
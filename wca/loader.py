@@ -0,0 +1,446 @@
+import io
+import logging
+import re
+from contextlib import contextmanager
+
+import pandas as pd
+from django.db import IntegrityError, connection, models, transaction
+
+log = logging.getLogger(__name__)
+
+# Key of the advisory lock that staging swaps are run under
+SWAP_LOCK_ID = 20210501
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def prepare_frame(model, df, columns):
+    """
+    Select and rename the TSV columns to model field names and coerce
+    integer columns so that they survive NaN values.
+    """
+    df = df[list(columns)].rename(columns=columns)
+    for name in df.columns:
+        field = model._meta.get_field(name)
+        if isinstance(field, models.IntegerField):
+            df[name] = df[name].astype("Int64")
+    return df
+
+
+def copy_frame(model, df, table=None):
+    """
+    Stream a prepared DataFrame into ``table`` (defaults to the model table)
+    using ``COPY FROM STDIN``.
+    """
+    if df.empty:
+        return 0
+
+    table = table or model._meta.db_table
+    columns = ", ".join(quote(model._meta.get_field(name).column) for name in df)
+    binary_columns = [
+        name
+        for name in df
+        if isinstance(model._meta.get_field(name), models.BinaryField)
+    ]
+    if binary_columns:
+        df = df.copy()
+        for name in binary_columns:
+            df[name] = df[name].map(lambda value: "\\x" + value.hex())
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, sep="\t", header=False, index=False)
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote(table)} ({columns}) FROM STDIN "
+            f"WITH (FORMAT csv, DELIMITER E'\\t')",
+            buffer,
+        )
+    return len(df)
+
+
+@transaction.atomic
+def upsert_frame(model, df):
+    """
+    Insert or update the rows of a prepared DataFrame by primary key. Like
+    ``update_or_create``, the last row wins when a key is repeated.
+    """
+    pk = model._meta.pk
+    df = df.drop_duplicates(pk.attname, keep="last")
+    if df.empty:
+        return 0
+
+    table = model._meta.db_table
+    temp_table = f"{table}_upsert"
+    columns = [model._meta.get_field(name).column for name in df]
+    column_list = ", ".join(quote(column) for column in columns)
+    updates = ", ".join(
+        f"{quote(column)} = EXCLUDED.{quote(column)}"
+        for column in columns
+        if column != pk.column
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {quote(temp_table)}")
+        cursor.execute(
+            f"CREATE TEMP TABLE {quote(temp_table)} "
+            f"(LIKE {quote(table)} INCLUDING DEFAULTS)"
+        )
+        copy_frame(model, df, table=temp_table)
+        cursor.execute(
+            f"INSERT INTO {quote(table)} ({column_list}) "
+            f"SELECT {column_list} FROM {quote(temp_table)} "
+            f"ON CONFLICT ({quote(pk.column)}) DO UPDATE SET {updates}"
+        )
+        cursor.execute(f"DROP TABLE {quote(temp_table)}")
+    return len(df)
+
+
+def load_rows(model, df, upsert=False):
+    """
+    Per-row ORM fallback of ``copy_frame`` and ``upsert_frame``.
+    """
+    pk_name = model._meta.pk.attname
+    df = df.astype(object).where(df.notna(), None)
+
+    for row in df.to_dict("records"):
+        if upsert:
+            pk = row.pop(pk_name)
+            model.objects.update_or_create(pk=pk, defaults=row)
+        else:
+            model.objects.create(**row)
+    return len(df)
+
+
+def normalize_frame(model, df, renames=None):
+    """
+    Give ``df`` the same dtypes whether it was read from a TSV or from the
+    database, so that row fingerprints can be compared. ``renames`` maps
+    column names that differ from their field name.
+    """
+    renames = renames or {}
+    df = df.copy()
+    for name in df.columns:
+        field = model._meta.get_field(renames.get(name, name))
+        if isinstance(field, models.IntegerField):
+            df[name] = df[name].astype("Int64")
+        elif isinstance(field, models.BinaryField):
+            df[name] = df[name].map(bytes)
+        elif isinstance(field, models.DateField):
+            dates = pd.to_datetime(df[name]).dt.strftime("%Y-%m-%d")
+            df[name] = dates.astype(object).where(dates.notna(), None)
+        else:
+            df[name] = df[name].astype(object).where(df[name].notna(), None)
+    return df
+
+
+def fingerprint(df):
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+def apply_delta(model, df, key=None, delete=True):
+    """
+    Diff a prepared DataFrame against the rows already in ``model``'s table
+    and apply only the changes. Rows are matched by the ``key`` columns
+    (defaults to the primary key) and compared by fingerprint. Rows missing
+    from ``df`` are deleted unless ``delete`` is false.
+
+    Returns a dict with the inserted, updated and deleted row counts.
+    """
+    pk = model._meta.pk
+    old_pk = f"{pk.attname}_old"
+    key = list(key or [pk.attname])
+    columns = list(df.columns)
+    values = [name for name in columns if name not in key and name != pk.attname]
+
+    df = normalize_frame(model, df.drop_duplicates(key, keep="last"))
+    old_df = pd.DataFrame.from_records(
+        model.objects.values_list(pk.attname, *key, *values),
+        columns=[old_pk, *key, *values],
+    )
+    old_df = normalize_frame(model, old_df, renames={old_pk: pk.attname})
+    df["fingerprint"] = fingerprint(df[values])
+    old_df["fingerprint"] = fingerprint(old_df[values])
+
+    merged = df.merge(
+        old_df[[*key, old_pk, "fingerprint"]],
+        on=key,
+        how="outer",
+        suffixes=("", "_old"),
+        indicator=True,
+    )
+    inserts = merged[merged["_merge"] == "left_only"]
+    updates = merged[
+        (merged["_merge"] == "both")
+        & (merged["fingerprint"] != merged["fingerprint_old"])
+    ]
+    deletes = merged[merged["_merge"] == "right_only"] if delete else merged[:0]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not deletes.empty:
+            cursor.execute(
+                f"DELETE FROM {quote(model._meta.db_table)} "
+                f"WHERE {quote(pk.column)} = ANY(%s)",
+                [deletes[old_pk].tolist()],
+            )
+        copy_frame(model, inserts[columns])
+        update_frame(
+            model,
+            updates[[*key, *values]].assign(**{pk.attname: updates[old_pk]}),
+        )
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+    }
+
+
+@transaction.atomic
+def update_frame(model, df):
+    """
+    Update existing rows by primary key with the values of a prepared
+    DataFrame.
+    """
+    if df.empty:
+        return 0
+
+    pk = model._meta.pk
+    table = model._meta.db_table
+    temp_table = f"{table}_update"
+    columns = [model._meta.get_field(name).column for name in df]
+    updates = ", ".join(
+        f"{quote(column)} = t.{quote(column)}"
+        for column in columns
+        if column != pk.column
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {quote(temp_table)}")
+        cursor.execute(
+            f"CREATE TEMP TABLE {quote(temp_table)} "
+            f"(LIKE {quote(table)} INCLUDING DEFAULTS)"
+        )
+        copy_frame(model, df, table=temp_table)
+        cursor.execute(
+            f"UPDATE {quote(table)} SET {updates} FROM {quote(temp_table)} t "
+            f"WHERE {quote(table)}.{quote(pk.column)} = t.{quote(pk.column)}"
+        )
+        cursor.execute(f"DROP TABLE {quote(temp_table)}")
+    return len(df)
+
+
+@contextmanager
+def swap_lock():
+    """
+    Session advisory lock held by one staging swap at a time, across threads
+    and processes. Swaps lock the tables their foreign keys reference, in
+    differing orders, so concurrent swaps could deadlock.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [SWAP_LOCK_ID])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [SWAP_LOCK_ID])
+
+
+class StagingTable:
+    """
+    Shadow copy of a model table that is filled in the background and then
+    swapped in with a rename, so readers never see a partially loaded table.
+
+        with StagingTable(Result) as staging:
+            staging.copy(df)
+
+    Indexes are built on the staging table before the swap. The swap itself
+    only drops the old table and renames the new one, inside one short
+    transaction. A failed load leaves the live table untouched, and the
+    staging table in place so that it can be resumed with ``resume=True``.
+
+    ``derived`` pairs the models of tables that point at rows of this one with
+    a function that fills them from it. They are built into staging tables of
+    their own before the swap, given the staging table names to read from and
+    write to, and swapped in along with this one, so that readers never see
+    them out of step.
+    """
+
+    def __init__(self, model, resume=False, derived=()):
+        self.model = model
+        self.table = model._meta.db_table
+        self.name = f"{self.table}_staging"
+        self.resume = resume
+        self.resumed = False
+        self.derived = derived
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.swap()
+        return False
+
+    def create(self):
+        if self.resume and self.name in connection.introspection.table_names():
+            self.resumed = True
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {quote(self.name)}")
+            cursor.execute(
+                f"CREATE TABLE {quote(self.name)} (LIKE {quote(self.table)} "
+                f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+
+    def copy(self, df):
+        return copy_frame(self.model, df, table=self.name)
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {quote(self.name)}")
+            (count,) = cursor.fetchone()
+        return count
+
+    def get_indexes(self, cursor, table=None):
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid), c.conname, c.contype "
+            "FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid "
+            "AND c.conrelid = x.indrelid "
+            "WHERE x.indrelid = %s::regclass ORDER BY i.relname",
+            [table or self.table],
+        )
+        return cursor.fetchall()
+
+    def get_foreign_keys(self, cursor):
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f' ORDER BY conname",
+            [self.table],
+        )
+        return cursor.fetchall()
+
+    def drop_indexes(self, cursor):
+        """
+        Drop the indexes left on the staging table by a failed swap, so that
+        they can be built again under the same temporary names.
+        """
+        for name, _, constraint, _ in self.get_indexes(cursor, table=self.name):
+            if constraint:
+                cursor.execute(
+                    f"ALTER TABLE {quote(self.name)} "
+                    f"DROP CONSTRAINT {quote(constraint)}"
+                )
+            else:
+                cursor.execute(f"DROP INDEX {quote(name)}")
+
+    def build_indexes(self, cursor, indexes):
+        """
+        Recreate the live table's indexes on the staging table under
+        temporary names, returning ``(temporary, original)`` name pairs.
+        """
+        self.drop_indexes(cursor)
+        renames = []
+        constraint_types = {"p": "PRIMARY KEY", "u": "UNIQUE"}
+        for number, (name, definition, constraint, contype) in enumerate(indexes):
+            temp_name = f"{self.name}_{number}"
+            cursor.execute(
+                re.sub(
+                    r" INDEX \S+ ON (ONLY )?\S+ ",
+                    f" INDEX {quote(temp_name)} ON {quote(self.name)} ",
+                    definition,
+                    count=1,
+                )
+            )
+            if constraint:
+                cursor.execute(
+                    f"ALTER TABLE {quote(self.name)} ADD CONSTRAINT "
+                    f"{quote(temp_name)} {constraint_types[contype]} "
+                    f"USING INDEX {quote(temp_name)}"
+                )
+            renames.append((temp_name, constraint or name, bool(constraint)))
+        cursor.execute(f"ANALYZE {quote(self.name)}")
+        return renames
+
+    def prepare(self):
+        """
+        Build the indexes of the staging table, returning the temporary index
+        names and the foreign keys to re-create on swap.
+        """
+        with connection.cursor() as cursor:
+            indexes = self.get_indexes(cursor)
+            foreign_keys = self.get_foreign_keys(cursor)
+            renames = self.build_indexes(cursor, indexes)
+        return renames, foreign_keys
+
+    def swap(self):
+        tables = [(self, self.prepare())]
+        for model, build in self.derived:
+            staging = StagingTable(model)
+            staging.create()
+            build(self.name, staging.name)
+            tables.append((staging, staging.prepare()))
+
+        # Validating the foreign keys locks the referenced tables as well
+        with swap_lock():
+            with transaction.atomic(), connection.cursor() as cursor:
+                for staging, (renames, foreign_keys) in tables:
+                    staging.swap_in(cursor, renames, foreign_keys)
+            for staging, (_, foreign_keys) in tables:
+                staging.validate_foreign_keys(foreign_keys)
+
+    def swap_in(self, cursor, renames, foreign_keys):
+        """
+        Replace the live table with the staging table, given the temporary
+        index names and the foreign keys to re-create.
+        """
+        cursor.execute(f"LOCK TABLE {quote(self.table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, %s)",
+            [self.table, self.model._meta.pk.column],
+        )
+        (sequence,) = cursor.fetchone()
+        if sequence:
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence} OWNED BY "
+                f"{quote(self.name)}.{quote(self.model._meta.pk.column)}"
+            )
+        cursor.execute(f"DROP TABLE {quote(self.table)}")
+        cursor.execute(f"ALTER TABLE {quote(self.name)} RENAME TO {quote(self.table)}")
+        for temp_name, name, is_constraint in renames:
+            if is_constraint:
+                cursor.execute(
+                    f"ALTER TABLE {quote(self.table)} RENAME CONSTRAINT "
+                    f"{quote(temp_name)} TO {quote(name)}"
+                )
+            else:
+                cursor.execute(
+                    f"ALTER INDEX {quote(temp_name)} RENAME TO {quote(name)}"
+                )
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {quote(self.table)} ADD CONSTRAINT "
+                f"{quote(name)} {definition} NOT VALID"
+            )
+
+    def validate_foreign_keys(self, foreign_keys):
+        """
+        Validate the re-created foreign keys outside of the swap, since
+        validation scans the table but does not block readers.
+        """
+        for name, _ in foreign_keys:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f"ALTER TABLE {quote(self.table)} "
+                        f"VALIDATE CONSTRAINT {quote(name)}"
+                    )
+            except IntegrityError as error:
+                log.warning(f"  {self.table}.{name} is not valid: {error}")
@@ -0,0 +1,278 @@
+import logging
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.serializers import ListSerializer
+
+from wca.events import get_event_info
+from wca.loader import copy_frame, quote
+from wca.models import Competition, Continent, Country, Event, Person, Result, RoundType
+from wca.rankings import PH_COUNTRY_ID, RankingQuery
+from wca.serializers import RankingSerializer, ResultSerializer
+from wca.utils import format_values, parse_value
+
+log = logging.getLogger(__name__)
+
+EVENT_COUNT = 17
+COMPETITION_COUNT = 600
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark hot code paths against a synthetic PH-sized dataset. "
+        "The dataset is created in a transaction that is rolled back."
+    )
+    targets = ("rankings", "formatting", "serialization")
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", choices=self.targets)
+        parser.add_argument(
+            "--persons",
+            type=int,
+            default=8_000,
+            help="Number of persons in the dataset.",
+        )
+        parser.add_argument(
+            "--results",
+            type=int,
+            default=300_000,
+            help="Number of results in the dataset.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of timed runs of each case.",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print the EXPLAIN ANALYZE plan of each query.",
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        self.explain = options["explain"]
+        with transaction.atomic():
+            start = time.monotonic()
+            self.create_dataset(options["persons"], options["results"])
+            log.info(f"Dataset created ({time.monotonic() - start:.2f}s)")
+            getattr(self, f"benchmark_{options['target']}")()
+            transaction.set_rollback(True)
+
+    def create_dataset(self, person_count, result_count):
+        rng = np.random.default_rng(0)
+        continent, _ = Continent.objects.get_or_create(
+            id="_Asia",
+            defaults=dict(
+                name="Asia", record_name="AsR", latitude=0, longitude=0, zoom=0
+            ),
+        )
+        Country.objects.get_or_create(
+            id=PH_COUNTRY_ID,
+            defaults=dict(name="Philippines", continent=continent, iso2="PH"),
+        )
+        round_type, _ = RoundType.objects.get_or_create(
+            id="f", defaults=dict(rank=199, name="Final", cell_name="Final", final=1)
+        )
+        self.events = Event.objects.bulk_create(
+            Event(
+                id=f"bnch{number:02}",
+                name=f"Benchmark {number}",
+                rank=1000 + number,
+                format="time",
+                cell_name=f"Benchmark {number}",
+            )
+            for number in range(EVENT_COUNT)
+        )
+        competitions = Competition.objects.bulk_create(
+            Competition(
+                id=f"Benchmark{number:04}",
+                name=f"Benchmark {number}",
+                city_name="Manila",
+                country_id=PH_COUNTRY_ID,
+                year=2021,
+                month=1,
+                day=1,
+                end_month=1,
+                end_day=1,
+                cell_name=f"Benchmark {number}",
+            )
+            for number in range(COMPETITION_COUNT)
+        )
+
+        person_ids = np.array([f"9{number:05}BNCH" for number in range(person_count)])
+        copy_frame(
+            Person,
+            pd.DataFrame(
+                {
+                    "id": person_ids,
+                    "subid": 1,
+                    "name": person_ids,
+                    "country_id": PH_COUNTRY_ID,
+                }
+            ),
+        )
+
+        # Few persons compete a lot, most compete a few times
+        weights = 1 / np.arange(50, person_count + 50)
+        persons = rng.choice(person_count, result_count, p=weights / weights.sum())
+        best = rng.normal(2500, 1000, result_count).clip(300).astype(int)
+        best[rng.random(result_count) < 0.05] = -1
+        average = (best * rng.uniform(1.05, 1.3, result_count)).astype(int)
+        average[(best < 0) | (rng.random(result_count) < 0.2)] = 0
+        values = {f"value{number}": best for number in range(1, 6)}
+        copy_frame(
+            Result,
+            pd.DataFrame(
+                {
+                    "competition_id": rng.choice(
+                        [competition.id for competition in competitions], result_count
+                    ),
+                    "event_id": rng.choice(
+                        [event.id for event in self.events], result_count
+                    ),
+                    "round_type_id": round_type.id,
+                    "pos": rng.integers(1, 50, result_count),
+                    "best": best,
+                    "average": average,
+                    "person_name": person_ids[persons],
+                    "person_id": person_ids[persons],
+                    "country_id": PH_COUNTRY_ID,
+                    **values,
+                }
+            ),
+        )
+
+        self.person_ids = person_ids
+        self.analyze([Person, Result])
+
+    def analyze(self, models):
+        with connection.cursor() as cursor:
+            for model in models:
+                cursor.execute(f"ANALYZE {quote(model._meta.db_table)}")
+
+    def run_case(self, name, run, sql=None):
+        """
+        Time ``run`` and log the median and slowest latency, and the plan of
+        ``sql`` with --explain.
+        """
+        run()
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        log.info(
+            f"  {name}: median {statistics.median(timings):.2f} ms, "
+            f"max {max(timings):.2f} ms"
+        )
+        if self.explain and sql:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql[0]}", sql[1])
+                plan = "\n".join(f"    {line}" for (line,) in cursor.fetchall())
+            log.info(plan)
+
+    def benchmark_rankings(self):
+        self.compare_rankings("all persons", None, None)
+
+    def compare_rankings(self, label, person_ids, wca_ids):
+        """
+        Time the top 100 of the ranking of ``wca_ids`` against the legacy
+        query, which filters by the ``person_ids`` subquery.
+        """
+        event = max(self.events, key=lambda event: event.id)
+        for rank_type in ["best", "average"]:
+            legacy = self.get_legacy_ranking(event, rank_type, person_ids)[:100]
+            ranking = RankingQuery(event, rank_type, wca_ids)
+            log.info(f"Ranking of {label} by {rank_type}, top 100")
+            self.run_case(
+                "DISTINCT ON + IN",
+                lambda: list(legacy.all()),
+                legacy.query.sql_with_params(),
+            )
+            self.run_case(
+                "window",
+                lambda: list(ranking[:100]),
+                ranking.clone(limit=100).get_sql(),
+            )
+
+    def benchmark_formatting(self):
+        event = max(self.events, key=lambda event: event.id)
+        values = np.array(
+            Result.objects.filter(event=event).values_list("best", flat=True)
+        )
+        log.info(f"Formatting {len(values)} times")
+        self.run_case(
+            "parse_value", lambda: [parse_value(value, "time") for value in values]
+        )
+        self.run_case("format_values", lambda: format_values(values, "time"))
+
+        for rank_type in ["best", "average"]:
+            context = {"rank_type": rank_type}
+            results = list(RankingQuery(event, rank_type)[:1000])
+            log.info(f"Serializing a {rank_type} ranking of 1000 results")
+            self.run_case(
+                "per result",
+                lambda: ListSerializer(
+                    results, child=ResultSerializer(), context=context
+                ).data,
+            )
+            self.run_case(
+                "batch",
+                lambda: ResultSerializer(results, many=True, context=context).data,
+            )
+
+    def benchmark_serialization(self):
+        event = max(self.events, key=lambda event: event.id)
+        event_info = get_event_info(event.id)
+        for rank_type in ["best", "average"]:
+            context = {"rank_type": rank_type}
+            ranking = RankingQuery(event, rank_type)
+            results = list(ranking[:1000])
+            rows = list(ranking.values()[:1000])
+            log.info(f"Serializing a {rank_type} ranking of 1000 results")
+            self.run_case(
+                "ResultSerializer",
+                lambda: ListSerializer(
+                    results, child=ResultSerializer(), context=context
+                ).data,
+            )
+            self.run_case(
+                "RankingSerializer",
+                lambda: RankingSerializer(rows, event_info, rank_type).data,
+            )
+            log.info(f"Reading and serializing a {rank_type} ranking of 1000 results")
+            self.run_case(
+                "RankingQuery + ResultSerializer",
+                lambda: ResultSerializer(
+                    ranking[:1000], many=True, context=context
+                ).data,
+            )
+            self.run_case(
+                "RankingQuery.values() + RankingSerializer",
+                lambda: RankingSerializer(
+                    ranking.values()[:1000], event_info, rank_type
+                ).data,
+            )
+
+    def get_legacy_ranking(self, event, rank_type, person_ids):
+        results = Result.objects.filter(
+            country_id=PH_COUNTRY_ID, event=event, **{f"{rank_type}__gt": 0}
+        )
+        if person_ids is not None:
+            results = results.filter(person_id__in=person_ids)
+        result_ids = (
+            results.order_by("person_id", rank_type)
+            .distinct("person_id")
+            .values_list("id")
+        )
+        return (
+            Result.objects.filter(pk__in=result_ids)
+            .select_related("event", "person", "competition")
+            .order_by(rank_type)
+        )
@@ -1,13 +1,27 @@
 import json
 import logging
-import math
+import re
+import resource
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-import numpy as np
 import pandas as pd
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db import transaction
-
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from wca.api import bump_data_version, set_export_date
+from wca.loader import (
+    StagingTable,
+    apply_delta,
+    copy_frame,
+    load_rows,
+    prepare_frame,
+    quote,
+    upsert_frame,
+)
 from wca.models import (
     Championship,
     Competition,
@@ -15,21 +29,148 @@ from wca.models import (
     Country,
     Event,
     Format,
+    ImportCheckpoint,
+    NationalRanking,
     Person,
+    PersonCareerStats,
     RanksAverage,
     RanksSingle,
     Result,
     RoundType,
+    Scramble,
 )
+from wca.utils import compress_scramble
 
 log = logging.getLogger(__name__)
 
 PH_ID = "Philippines"
 DUMP_DIR = settings.BASE_DIR.joinpath("data/extracted/")
+CHUNK_SIZE = 100_000
+
+# Import steps in their --step order, with the steps they depend on
+STEPS = (
+    ("import_continents", ()),
+    ("import_countries", ("import_continents",)),
+    ("import_events", ()),
+    ("import_formats", ()),
+    ("import_round_types", ()),
+    ("import_competitions", ("import_countries",)),
+    ("import_persons", ("import_countries",)),
+    ("import_ranks_average", ("import_events", "import_persons")),
+    ("import_ranks_single", ("import_events", "import_persons")),
+    (
+        "import_results",
+        (
+            "import_competitions",
+            "import_events",
+            "import_formats",
+            "import_round_types",
+            "import_persons",
+        ),
+    ),
+    ("import_championships", ("import_competitions",)),
+    (
+        "import_scrambles",
+        (
+            "import_competitions",
+            "import_events",
+            "import_round_types",
+            "import_results",
+        ),
+    ),
+    # Swapping in a staging table locks the tables it references, so the
+    # join tables are rebuilt only once those swaps are done
+    (
+        "import_competition_relations",
+        (
+            "import_competitions",
+            "import_events",
+            "import_persons",
+            "import_ranks_average",
+            "import_ranks_single",
+            "import_results",
+            "import_scrambles",
+        ),
+    ),
+    (
+        "import_career_stats",
+        (
+            "import_events",
+            "import_persons",
+            "import_ranks_average",
+            "import_ranks_single",
+            "import_results",
+        ),
+    ),
+)
+# Name of a person in the "[{Name}{mailto:email}]" markup of competition
+# delegates and organizers
+MAILTO_NAME = re.compile(r"\[\{(?P<name>[^}]+)\}\{mailto:[^}]*\}\]")
+RESULT_DTYPES = {
+    "competitionId": str,
+    "eventId": str,
+    "roundTypeId": str,
+    "pos": "int16",
+    "best": "int32",
+    "average": "int32",
+    "personName": str,
+    "personId": str,
+    "personCountryId": str,
+    "formatId": str,
+    "value1": "int32",
+    "value2": "int32",
+    "value3": "int32",
+    "value4": "int32",
+    "value5": "int32",
+    "regionalSingleRecord": str,
+    "regionalAverageRecord": str,
+}
+
+
+def concat_chunks(chunks, columns):
+    """
+    Concatenate DataFrame chunks, falling back to an empty frame with the
+    TSV ``columns`` for a file without data rows, which has no chunks.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(chunks)
+
+
+def reset_peak_memory():
+    """
+    Reset the peak resident set size of the process, where the kernel
+    supports it, so that it can be measured per import step.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def get_peak_memory():
+    """
+    Peak resident set size of the process in MiB.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 
 class Command(BaseCommand):
     help = "Import data from WCA"
+    row_by_row = False
+    delta = False
+    resume = False
+    archive = None
+    export_date = None
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -44,280 +185,662 @@ class Command(BaseCommand):
             default=1,
             help="Starting import step.",
         )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue an interrupted import of the same export.",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of import steps to run in parallel.",
+        )
+        parser.add_argument(
+            "--row-by-row",
+            action="store_true",
+            help="Write rows one at a time through the ORM instead of using COPY.",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only write the rows that changed since the previous import.",
+        )
+        parser.add_argument(
+            "--archive",
+            help="Read the export from WCA_export.tsv.zip instead of extracted files.",
+        )
+        parser.add_argument(
+            "--warm-caches",
+            action="store_true",
+            help="Pre-render rankings and profiles into the cache after importing.",
+        )
 
     def handle(self, *args, **options):
         previous_metadata = DUMP_DIR.joinpath("previous_metadata.json")
         print(options)
 
+        if options["jobs"] < 1:
+            raise CommandError("--jobs must be at least 1.")
+
+        if options["archive"]:
+            self.archive = zipfile.ZipFile(options["archive"])
+
+        metadata = self.read_metadata()
+        if metadata:
+            self.export_date = metadata["export_date"]
+
         if not options["force"] and previous_metadata.is_file():
-            with open(DUMP_DIR.joinpath("metadata.json")) as metadata_file:
-                metadata = json.load(metadata_file)
             with open(previous_metadata) as previous_metadata_file:
-                previous_metadata = json.load(previous_metadata_file)
-            if metadata["export_date"] == previous_metadata["export_date"]:
+                previous = json.load(previous_metadata_file)
+            if self.export_date == previous["export_date"]:
                 log.info("Data is up-to-date.")
                 return
 
-        self.start_import(options["step"])
-
-    def start_import(self, step=1):
-        steps = [
-            self.import_continents,
-            self.import_countries,
-            self.import_events,
-            self.import_formats,
-            self.import_round_types,
-            self.import_competitions,
-            self.import_persons,
-            self.import_ranks_average,
-            self.import_ranks_single,
-            self.import_results,
-            self.import_championships,
-        ]
-
-        for step_func in steps[step - 1 :]:
-            step_func()
+        self.row_by_row = options["row_by_row"]
+        self.delta = options["delta"]
+        self.resume = options["resume"]
+        self.start_import(options["step"], options["jobs"])
+
+        if self.archive:
+            # Nothing is extracted, so keep the imported metadata for the next
+            # up-to-date check ourselves.
+            DUMP_DIR.mkdir(parents=True, exist_ok=True)
+            with self.open_file("metadata.json") as metadata_file:
+                previous_metadata.write_bytes(metadata_file.read())
+            self.archive.close()
+
+        if options["warm_caches"]:
+            call_command("warm_caches", jobs=options["jobs"])
+
+    def start_import(self, step=1, jobs=1):
+        """
+        Run the import steps from ``step`` onwards. Steps before ``step`` are
+        assumed to be done, and so are the finished steps of the same export
+        when resuming. With more than one job, every step starts as soon as
+        the steps it depends on have committed.
+        """
+        self.changes = {}
+        start = time.monotonic()
+        self.checkpoints = self.get_checkpoints()
+        pending = {
+            name: set(dependencies)
+            for name, dependencies in STEPS[step - 1 :]
+            if not (name in self.checkpoints and self.checkpoints[name].is_done)
+        }
+        for dependencies in pending.values():
+            dependencies.intersection_update(pending)
+
+        if jobs == 1:
+            for name in pending:
+                self.run_step(name)
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                running = {}
+                while pending or running:
+                    for name in [name for name, deps in pending.items() if not deps]:
+                        del pending[name]
+                        future = executor.submit(self.run_step, name, threaded=True)
+                        running[future] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        future.result()
+                        for dependencies in pending.values():
+                            dependencies.discard(name)
+            # Steps share the process, so only its overall peak is known
+            log.info(f"  process peak memory {get_peak_memory():.0f} MiB")
+
+        for table, changes in self.changes.items():
+            log.info(
+                f"  {table}: {changes['inserted']} inserted, "
+                f"{changes['updated']} updated, {changes['deleted']} deleted"
+            )
+        if self.export_date:
+            set_export_date(self.export_date)
+        bump_data_version()
+        log.info(f"Data import successful! ({time.monotonic() - start:.2f}s)")
+
+    def run_step(self, name, threaded=False):
+        try:
+            if not threaded:
+                reset_peak_memory()
+            start = time.monotonic()
+            rows = getattr(self, name)()
+            self.save_checkpoint(name, is_done=True)
+            elapsed = time.monotonic() - start
+            memory = "" if threaded else f", peak memory {get_peak_memory():.0f} MiB"
+            log.info(
+                f"  {name}: {rows} rows in {elapsed:.2f}s "
+                f"({rows / max(elapsed, 0.001):.0f} rows/s{memory})"
+            )
+        finally:
+            if threaded:
+                connection.close()
+
+    def get_checkpoints(self):
+        if not self.resume:
+            ImportCheckpoint.objects.all().delete()
+            return {}
+        checkpoints = ImportCheckpoint.objects.filter(export_date=self.export_date)
+        return {checkpoint.step: checkpoint for checkpoint in checkpoints}
+
+    def save_checkpoint(self, step, chunk=None, is_done=False):
+        ImportCheckpoint.objects.update_or_create(
+            step=step,
+            defaults={
+                "export_date": self.export_date,
+                "chunk": chunk,
+                "is_done": is_done,
+            },
+        )
 
-        log.info("Data import successful!")
+    def read_metadata(self):
+        try:
+            with self.open_file("metadata.json") as metadata_file:
+                return json.load(metadata_file)
+        except (FileNotFoundError, KeyError):
+            return None
+
+    def open_file(self, filename):
+        """
+        Open an export file, streaming it from the archive when one is given.
+        """
+        if self.archive:
+            return self.archive.open(filename)
+        return open(DUMP_DIR.joinpath(filename), "rb")
+
+    def read_tsv(self, filename, **kwargs):
+        with self.open_file(filename) as tsv_file:
+            return pd.read_csv(tsv_file, sep="\t", **kwargs)
+
+    def read_tsv_chunks(self, filename, columns, where, dtype=None):
+        """
+        Stream ``filename`` in chunks of ``CHUNK_SIZE`` rows, reading only
+        ``columns`` and keeping the rows for which ``where(chunk)`` is true,
+        so memory stays flat regardless of the export size.
+        """
+        with self.open_file(filename) as tsv_file, pd.read_csv(
+            tsv_file,
+            sep="\t",
+            usecols=list(columns),
+            dtype=dtype,
+            chunksize=CHUNK_SIZE,
+        ) as reader:
+            for chunk in reader:
+                yield chunk[where(chunk)]
+
+    def load(self, model, df, columns, upsert=False):
+        """
+        Write the TSV ``columns`` of ``df`` to ``model``, mapped to the given
+        field names. Rows are upserted by primary key when ``upsert`` is set
+        and appended otherwise.
+        """
+        df = prepare_frame(model, df, columns)
+        if self.delta and upsert:
+            return self.load_delta(model, df, delete=False)
+        if self.row_by_row:
+            return load_rows(model, df, upsert=upsert)
+        if upsert:
+            return upsert_frame(model, df)
+        return copy_frame(model, df)
+
+    def load_delta(self, model, df, key=None, delete=True):
+        self.changes[model._meta.db_table] = apply_delta(
+            model, df, key=key, delete=delete
+        )
+        return len(df)
+
+    def replace(self, model, chunks, columns, key, step, derived=()):
+        """
+        Replace the contents of ``model``'s table with the TSV ``columns`` of
+        the DataFrame ``chunks``. The rows are loaded into a staging table
+        that is swapped in once complete, so readers keep seeing the previous
+        data until then. A checkpoint of ``step`` is committed with every
+        chunk, so that an interrupted load can be resumed from there.
+
+        In delta mode only the rows that changed, matched by the ``key``
+        fields, are written to the live table instead.
+
+        ``derived`` pairs the models of tables built from ``model``'s rows
+        with the functions that build them. They are swapped in along with
+        the staging table, or rebuilt in the same transaction as the new rows
+        are committed in.
+        """
+        if self.delta:
+            df = prepare_frame(model, concat_chunks(chunks, columns), columns)
+            with transaction.atomic():
+                rows = self.load_delta(model, df, key=key)
+                for _, build in derived:
+                    build()
+                return rows
+        if self.row_by_row:
+            with transaction.atomic():
+                model.objects.all().delete()
+                rows = sum(self.load(model, chunk, columns) for chunk in chunks)
+                for _, build in derived:
+                    build()
+                return rows
+
+        checkpoint = self.checkpoints.get(step)
+        with StagingTable(
+            model, resume=checkpoint is not None, derived=derived
+        ) as staging:
+            start = 0
+            if staging.resumed and checkpoint.chunk is not None:
+                start = checkpoint.chunk + 1
+                log.info(f"  resuming {step} from chunk {start + 1}")
+            for index, chunk in enumerate(chunks):
+                if index < start:
+                    continue
+                with transaction.atomic():
+                    staging.copy(prepare_frame(model, chunk, columns))
+                    self.save_checkpoint(step, chunk=index)
+            # Including the rows copied before a resume
+            rows = staging.count()
+        return rows
 
     @transaction.atomic
     def import_continents(self):
         log.info("  importing continents")
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Continents.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-
-        for row in df.itertuples():
-            Continent.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "name": row.name,
-                    "record_name": row.recordName,
-                    "latitude": row.latitude,
-                    "longitude": row.longitude,
-                    "zoom": row.zoom,
-                },
-            )
+        df = self.read_tsv("WCA_export_Continents.tsv")
+        columns = {
+            "id": "id",
+            "name": "name",
+            "recordName": "record_name",
+            "latitude": "latitude",
+            "longitude": "longitude",
+            "zoom": "zoom",
+        }
+        return self.load(Continent, df, columns, upsert=True)
 
     @transaction.atomic
     def import_countries(self):
         log.info("  importing countries")
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Countries.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-
-        for row in df.itertuples():
-            Country.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "name": row.name,
-                    "continent_id": row.continentId,
-                    "iso2": row.iso2,
-                },
-            )
+        df = self.read_tsv("WCA_export_Countries.tsv")
+        columns = {
+            "id": "id",
+            "name": "name",
+            "continentId": "continent_id",
+            "iso2": "iso2",
+        }
+        return self.load(Country, df, columns, upsert=True)
 
     @transaction.atomic
     def import_events(self):
         log.info("  importing events")
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Events.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-
-        for row in df.itertuples():
-            Event.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "name": row.name,
-                    "rank": row.rank,
-                    "format": row.format,
-                    "cell_name": row.cellName,
-                },
-            )
+        df = self.read_tsv("WCA_export_Events.tsv", dtype={"id": str})
+        columns = {
+            "id": "id",
+            "name": "name",
+            "rank": "rank",
+            "format": "format",
+            "cellName": "cell_name",
+        }
+        return self.load(Event, df, columns, upsert=True)
 
     @transaction.atomic
     def import_formats(self):
         log.info("  importing formats")
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Formats.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-
-        for row in df.itertuples():
-            Format.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "name": row.name,
-                    "sort_by": row.sort_by,
-                    "sort_by_second": row.sort_by_second,
-                    "expected_solve_count": row.expected_solve_count,
-                    "trim_fastest_n": row.trim_fastest_n,
-                    "trim_slowest_n": row.trim_slowest_n,
-                },
-            )
+        df = self.read_tsv("WCA_export_Formats.tsv", dtype={"id": str})
+        columns = {
+            "id": "id",
+            "name": "name",
+            "sort_by": "sort_by",
+            "sort_by_second": "sort_by_second",
+            "expected_solve_count": "expected_solve_count",
+            "trim_fastest_n": "trim_fastest_n",
+            "trim_slowest_n": "trim_slowest_n",
+        }
+        return self.load(Format, df, columns, upsert=True)
 
     @transaction.atomic
     def import_round_types(self):
         log.info("  importing round types")
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_RoundTypes.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-
-        for row in df.itertuples():
-            RoundType.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "rank": row.rank,
-                    "name": row.name,
-                    "cell_name": row.cellName,
-                    "final": row.final,
-                },
-            )
+        df = self.read_tsv("WCA_export_RoundTypes.tsv", dtype={"id": str})
+        columns = {
+            "id": "id",
+            "rank": "rank",
+            "name": "name",
+            "cellName": "cell_name",
+            "final": "final",
+        }
+        return self.load(RoundType, df, columns, upsert=True)
 
     @transaction.atomic
     def import_competitions(self):
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Competitions.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-        total_chunks = math.ceil(len(df) / 1000)
-
-        for index, group in df.groupby(np.arange(len(df)) // 1000):
-            log.info(f"  importing competitions chunk {index + 1}/{total_chunks}")
-            with transaction.atomic():
-                for row in group.itertuples():
-                    Competition.objects.update_or_create(
-                        id=row.id,
-                        defaults={
-                            "name": row.name,
-                            "city_name": row.cityName,
-                            "country_id": row.countryId,
-                            "information": row.information,
-                            "year": row.year,
-                            "month": row.month,
-                            "day": row.day,
-                            "end_month": row.endMonth,
-                            "end_day": row.endDay,
-                            "event_specs": row.eventSpecs,
-                            "wca_delegate": row.wcaDelegate,
-                            "organizer": row.organiser,
-                            "venue": row.venue,
-                            "venue_address": row.venueAddress,
-                            "venue_details": row.venueDetails,
-                            "external_website": row.external_website,
-                            "cell_name": row.cellName,
-                            "latitude": row.latitude,
-                            "longitude": row.longitude,
-                        },
-                    )
+        log.info("  importing competitions")
+        df = self.read_tsv("WCA_export_Competitions.tsv")
+        columns = {
+            "id": "id",
+            "name": "name",
+            "cityName": "city_name",
+            "countryId": "country_id",
+            "information": "information",
+            "year": "year",
+            "month": "month",
+            "day": "day",
+            "endMonth": "end_month",
+            "endDay": "end_day",
+            "eventSpecs": "event_specs",
+            "wcaDelegate": "wca_delegate",
+            "organiser": "organizer",
+            "venue": "venue",
+            "venueAddress": "venue_address",
+            "venueDetails": "venue_details",
+            "external_website": "external_website",
+            "cellName": "cell_name",
+            "latitude": "latitude",
+            "longitude": "longitude",
+            "startDate": "start_date",
+            "endDate": "end_date",
+        }
+        start_date = pd.to_datetime(
+            pd.DataFrame({"year": df["year"], "month": df["month"], "day": df["day"]}),
+            errors="coerce",
+        )
+        # Competitions ending in an earlier month roll over into the next year
+        end_date = pd.to_datetime(
+            pd.DataFrame(
+                {
+                    "year": df["year"] + (df["endMonth"] < df["month"]),
+                    "month": df["endMonth"],
+                    "day": df["endDay"],
+                }
+            ),
+            errors="coerce",
+        )
+        df["startDate"] = start_date.dt.strftime("%Y-%m-%d")
+        df["endDate"] = end_date.dt.strftime("%Y-%m-%d")
+        return self.load(Competition, df, columns, upsert=True)
 
     def get_persons_df(self):
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Persons.tsv"), sep="\t")
-        ph_df = df[df["countryId"] == PH_ID]
-        ph_df = ph_df.replace({np.nan: None})
-        return ph_df
+        columns = ["id", "subid", "name", "countryId", "gender"]
+        chunks = self.read_tsv_chunks(
+            "WCA_export_Persons.tsv",
+            columns,
+            where=lambda chunk: chunk["countryId"] == PH_ID,
+            dtype={"id": str, "subid": "int32", "name": str, "countryId": str},
+        )
+        return concat_chunks(chunks, columns)
 
     @transaction.atomic
     def import_persons(self):
         log.info("  importing persons")
         df = self.get_persons_df()
+        columns = {
+            "id": "id",
+            "subid": "subid",
+            "name": "name",
+            "countryId": "country_id",
+            "gender": "gender",
+        }
+        return self.load(Person, df, columns, upsert=True)
+
+    def import_ranks(self, model, filename, step):
+        person_ids = self.get_persons_df()["id"]
+        columns = {
+            "personId": "person_id",
+            "eventId": "event_id",
+            "best": "best",
+            "worldRank": "world_rank",
+            "continentRank": "continent_rank",
+            "countryRank": "country_rank",
+        }
+        chunks = self.read_tsv_chunks(
+            filename,
+            columns,
+            where=lambda chunk: chunk["personId"].isin(person_ids),
+            dtype={"personId": str, "eventId": str},
+        )
+        key = ["person_id", "event_id"]
+        return self.replace(model, chunks, columns, key=key, step=step)
 
-        for row in df.itertuples():
-            Person.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "subid": row.subid,
-                    "name": row.name,
-                    "country_id": row.countryId,
-                    "gender": row.gender,
-                },
-            )
-
-    @transaction.atomic
     def import_ranks_average(self):
         log.info("  importing ranks average")
-        persons_df = self.get_persons_df()
-
-        df = pd.read_csv(
-            DUMP_DIR.joinpath("WCA_export_RanksAverage.tsv"),
-            sep="\t",
-            dtype={"eventId": str},
+        return self.import_ranks(
+            RanksAverage, "WCA_export_RanksAverage.tsv", step="import_ranks_average"
         )
-        ph_df = df[df["personId"].isin(persons_df["id"])]
-        ph_df = ph_df.replace({np.nan: None})
-
-        RanksAverage.objects.all().delete()
-
-        for row in ph_df.itertuples():
-            RanksAverage.objects.create(
-                person_id=row.personId,
-                event_id=row.eventId,
-                best=row.best,
-                world_rank=row.worldRank,
-                continent_rank=row.continentRank,
-                country_rank=row.countryRank,
-            )
 
-    @transaction.atomic
     def import_ranks_single(self):
         log.info("  importing ranks single")
-        persons_df = self.get_persons_df()
+        return self.import_ranks(
+            RanksSingle, "WCA_export_RanksSingle.tsv", step="import_ranks_single"
+        )
 
-        df = pd.read_csv(
-            DUMP_DIR.joinpath("WCA_export_RanksSingle.tsv"),
-            sep="\t",
-            dtype={"eventId": str},
+    def import_results(self):
+        log.info("  importing results")
+        columns = {
+            "competitionId": "competition_id",
+            "eventId": "event_id",
+            "roundTypeId": "round_type_id",
+            "pos": "pos",
+            "best": "best",
+            "average": "average",
+            "personName": "person_name",
+            "personId": "person_id",
+            "personCountryId": "country_id",
+            "formatId": "format_id",
+            "value1": "value1",
+            "value2": "value2",
+            "value3": "value3",
+            "value4": "value4",
+            "value5": "value5",
+            "regionalSingleRecord": "regional_single_record",
+            "regionalAverageRecord": "regional_average_record",
+        }
+        chunks = self.read_tsv_chunks(
+            "WCA_export_Results.tsv",
+            columns,
+            where=lambda chunk: chunk["personCountryId"] == PH_ID,
+            dtype=RESULT_DTYPES,
+        )
+        key = ["competition_id", "event_id", "round_type_id", "person_id"]
+        return self.replace(
+            Result,
+            chunks,
+            columns,
+            key=key,
+            step="import_results",
+            derived=[(NationalRanking, self.build_national_rankings)],
         )
-        ph_df = df[df["personId"].isin(persons_df["id"])]
-        ph_df = ph_df.replace({np.nan: None})
-
-        RanksSingle.objects.all().delete()
-
-        for row in ph_df.itertuples():
-            RanksSingle.objects.create(
-                person_id=row.personId,
-                event_id=row.eventId,
-                best=row.best,
-                world_rank=row.worldRank,
-                continent_rank=row.continentRank,
-                country_rank=row.countryRank,
-            )
 
     @transaction.atomic
-    def import_results(self):
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_Results.tsv"), sep="\t")
-        ph_df = df[df["personCountryId"] == PH_ID]
-        ph_df = ph_df.replace({np.nan: None})
-        total_chunks = math.ceil(len(ph_df) / 1000)
+    def import_championships(self):
+        log.info("  importing championships")
+        df = self.read_tsv("WCA_export_championships.tsv")
+        columns = {
+            "id": "id",
+            "competition_id": "competition_id",
+            "championship_type": "championship_type",
+        }
+        return self.load(Championship, df, columns, upsert=True)
+
+    def import_scrambles(self):
+        """
+        Import the scrambles of the competitions held in the Philippines or
+        with results of Filipino competitors, rather than of every competition
+        in the export.
+        """
+        log.info("  importing scrambles")
+        competition_ids = set(
+            Competition.objects.filter(country_id=PH_ID).values_list("id", flat=True)
+        )
+        competition_ids.update(
+            Result.objects.values_list("competition_id", flat=True).distinct()
+        )
+        columns = {
+            "scrambleId": "scramble_id",
+            "competitionId": "competition_id",
+            "eventId": "event_id",
+            "roundTypeId": "round_type_id",
+            "groupId": "group_id",
+            "isExtra": "is_extra",
+            "scrambleNum": "scramble_num",
+            "scramble": "scramble",
+        }
+        chunks = self.read_tsv_chunks(
+            "WCA_export_Scrambles.tsv",
+            columns,
+            where=lambda chunk: chunk["competitionId"].isin(competition_ids),
+            dtype={
+                "competitionId": str,
+                "eventId": str,
+                "roundTypeId": str,
+                "groupId": str,
+                "scramble": str,
+            },
+        )
+        chunks = (
+            chunk.assign(scramble=chunk["scramble"].map(compress_scramble))
+            for chunk in chunks
+        )
+        return self.replace(
+            Scramble, chunks, columns, key=["scramble_id"], step="import_scrambles"
+        )
+
+    @transaction.atomic
+    def import_competition_relations(self):
+        """
+        Rebuild the events, delegates and organizers of every competition
+        from the imported event specs and mailto markup.
+        """
+        log.info("  importing competition events, delegates and organizers")
+        df = pd.DataFrame.from_records(
+            Competition.objects.values_list(
+                "id", "event_specs", "wca_delegate", "organizer"
+            ),
+            columns=["id", "event_specs", "wca_delegate", "organizer"],
+        )
 
-        Result.objects.all().delete()
+        events = df.assign(event_id=df["event_specs"].str.split()).explode("event_id")
+        event_ids = set(Event.objects.values_list("id", flat=True))
+        events = events[events["event_id"].isin(event_ids)]
+        rows = self.replace_relations(
+            Competition.events.through,
+            events,
+            {"id": "competition_id", "event_id": "event_id"},
+        )
 
-        for index, group in ph_df.groupby(np.arange(len(ph_df)) // 1000):
-            log.info(f"  importing results chunk {index + 1}/{total_chunks}")
-            with transaction.atomic():
-                for row in group.itertuples():
-                    Result.objects.create(
-                        competition_id=row.competitionId,
-                        event_id=row.eventId,
-                        round_type_id=row.roundTypeId,
-                        pos=row.pos,
-                        best=row.best,
-                        average=row.average,
-                        person_name=row.personName,
-                        person_id=row.personId,
-                        country_id=row.personCountryId,
-                        format_id=row.formatId,
-                        value1=row.value1,
-                        value2=row.value2,
-                        value3=row.value3,
-                        value4=row.value4,
-                        value5=row.value5,
-                        regional_single_record=row.regionalSingleRecord,
-                        regional_average_record=row.regionalAverageRecord,
-                    )
+        persons = pd.DataFrame.from_records(
+            Person.objects.values_list("name", "id"), columns=["name", "person_id"]
+        ).drop_duplicates("name", keep=False)
+        for column, relation in [
+            ("wca_delegate", Competition.delegates),
+            ("organizer", Competition.organizers),
+        ]:
+            names = df[column].str.extractall(MAILTO_NAME)
+            names["id"] = df["id"].to_numpy()[names.index.get_level_values(0)]
+            rows += self.replace_relations(
+                relation.through,
+                names.merge(persons, on="name"),
+                {"id": "competition_id", "person_id": "person_id"},
+            )
+        return rows
+
+    def replace_relations(self, through, df, columns):
+        through.objects.all().delete()
+        return self.load(through, df.drop_duplicates(list(columns)), columns)
 
     @transaction.atomic
-    def import_championships(self):
-        log.info("  importing championships")
-        df = pd.read_csv(DUMP_DIR.joinpath("WCA_export_championships.tsv"), sep="\t")
-        df = df.replace({np.nan: None})
-
-        for row in df.itertuples():
-            Championship.objects.update_or_create(
-                id=row.id,
-                defaults={
-                    "competition_id": row.competition_id,
-                    "championship_type": row.championship_type,
-                },
+    def build_national_rankings(self, results_table=None, table=None):
+        """
+        Rebuild the national rankings from the best single and average of
+        each person per event, with tied results sharing a rank.
+
+        The rankings point at result ids, which change with every swap of the
+        results, so ``import_results`` builds them from the staging results
+        into a staging table of their own, and swaps both in together.
+        """
+        log.info("  building national rankings")
+        results_table = quote(results_table or Result._meta.db_table)
+        table = quote(table or NationalRanking._meta.db_table)
+        rows = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+            for rank_type in ["best", "average"]:
+                cursor.execute(
+                    f"INSERT INTO {table} (event_id, rank_type, rank, person_id, "
+                    "value, result_id, competition_id) "
+                    f"SELECT event_id, %s, RANK() OVER ("
+                    f"PARTITION BY event_id ORDER BY {rank_type}), "
+                    f"person_id, {rank_type}, id, competition_id FROM ("
+                    f"SELECT DISTINCT ON (event_id, person_id) * FROM {results_table} "
+                    f"WHERE country_id = %s AND {rank_type} > 0 "
+                    f"ORDER BY event_id, person_id, {rank_type}, id) AS best",
+                    [rank_type, PH_ID],
+                )
+                rows += cursor.rowcount
+            cursor.execute(f"ANALYZE {table}")
+        return rows
+
+    @transaction.atomic
+    def import_career_stats(self):
+        """
+        Rebuild the career statistics of every person in one pass over the
+        results and ranks.
+        """
+        log.info("  building career stats")
+        table = quote(PersonCareerStats._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(
+                f"INSERT INTO {table} (person_id, competition_count, solve_count, "
+                "national_records, continental_records, world_records, "
+                "gold, silver, bronze, personal_records) "
+                "SELECT p.id, COALESCE(r.competition_count, 0), "
+                "COALESCE(r.solve_count, 0), COALESCE(r.national_records, 0), "
+                "COALESCE(r.continental_records, 0), COALESCE(r.world_records, 0), "
+                "COALESCE(r.gold, 0), COALESCE(r.silver, 0), COALESCE(r.bronze, 0), "
+                "COALESCE(pr.personal_records, '[]') "
+                "FROM (SELECT DISTINCT id FROM wca_person) p "
+                "LEFT JOIN ("
+                "SELECT r.person_id, "
+                "COUNT(DISTINCT r.competition_id) AS competition_count, "
+                "SUM((r.value1 > 0)::int + (r.value2 > 0)::int "
+                "+ (r.value3 > 0)::int + (r.value4 > 0)::int "
+                "+ (r.value5 > 0)::int) AS solve_count, "
+                "COUNT(*) FILTER (WHERE r.regional_single_record = 'NR') "
+                "+ COUNT(*) FILTER (WHERE r.regional_average_record = 'NR') "
+                "AS national_records, "
+                "COUNT(*) FILTER (WHERE r.regional_single_record NOT IN ('NR', 'WR')) "
+                "+ COUNT(*) FILTER "
+                "(WHERE r.regional_average_record NOT IN ('NR', 'WR')) "
+                "AS continental_records, "
+                "COUNT(*) FILTER (WHERE r.regional_single_record = 'WR') "
+                "+ COUNT(*) FILTER (WHERE r.regional_average_record = 'WR') "
+                "AS world_records, "
+                "COUNT(*) FILTER (WHERE t.final = 1 AND r.best > 0 AND r.pos = 1) "
+                "AS gold, "
+                "COUNT(*) FILTER (WHERE t.final = 1 AND r.best > 0 AND r.pos = 2) "
+                "AS silver, "
+                "COUNT(*) FILTER (WHERE t.final = 1 AND r.best > 0 AND r.pos = 3) "
+                "AS bronze "
+                "FROM wca_result r "
+                "LEFT JOIN wca_roundtype t ON t.id = r.round_type_id "
+                "GROUP BY r.person_id"
+                ") r ON r.person_id = p.id "
+                "LEFT JOIN ("
+                "SELECT pe.person_id, jsonb_agg(jsonb_build_object("
+                "'event_id', e.id, 'format', e.format, "
+                "'single', CASE WHEN s.id IS NOT NULL THEN jsonb_build_object("
+                "'best', s.best, 'world_rank', s.world_rank, "
+                "'continent_rank', s.continent_rank, "
+                "'country_rank', s.country_rank) END, "
+                "'average', CASE WHEN a.id IS NOT NULL THEN jsonb_build_object("
+                "'best', a.best, 'world_rank', a.world_rank, "
+                "'continent_rank', a.continent_rank, "
+                "'country_rank', a.country_rank) END"
+                ") ORDER BY e.rank, e.id) AS personal_records "
+                "FROM (SELECT person_id, event_id FROM wca_rankssingle "
+                "UNION SELECT person_id, event_id FROM wca_ranksaverage) pe "
+                "JOIN wca_event e ON e.id = pe.event_id "
+                "LEFT JOIN wca_rankssingle s "
+                "ON s.person_id = pe.person_id AND s.event_id = pe.event_id "
+                "LEFT JOIN wca_ranksaverage a "
+                "ON a.person_id = pe.person_id AND a.event_id = pe.event_id "
+                "GROUP BY pe.person_id"
+                ") pr ON pr.person_id = p.id"
             )
+            return cursor.rowcount
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wca', '0002_alter_person_gender'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('step', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('export_date', models.CharField(blank=True, max_length=50, null=True)),
+                ('chunk', models.IntegerField(blank=True, null=True)),
+                ('is_done', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
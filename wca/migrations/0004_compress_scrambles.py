@@ -0,0 +1,22 @@
+# Generated by Django 3.2.19 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wca', '0003_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scramble',
+            name='scramble',
+            field=models.BinaryField(),
+        ),
+        migrations.AddIndex(
+            model_name='scramble',
+            index=models.Index(fields=['competition', 'event', 'round_type'], name='wca_scrambl_competi_7073c7_idx'),
+        ),
+    ]
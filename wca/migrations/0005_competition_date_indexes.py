@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wca', '0004_compress_scrambles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='competition',
+            name='end_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='competition',
+            name='start_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
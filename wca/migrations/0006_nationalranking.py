@@ -0,0 +1,31 @@
+# Generated by Django 3.2.19 on 2026-10-18 20:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wca', '0005_competition_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NationalRanking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank_type', models.CharField(choices=[('best', 'Single'), ('average', 'Average')], max_length=7)),
+                ('rank', models.IntegerField()),
+                ('value', models.IntegerField()),
+                ('competition', models.ForeignKey(db_constraint=False, max_length=32, on_delete=django.db.models.deletion.DO_NOTHING, to='wca.competition')),
+                ('event', models.ForeignKey(db_constraint=False, max_length=6, on_delete=django.db.models.deletion.DO_NOTHING, to='wca.event')),
+                ('person', models.ForeignKey(db_constraint=False, max_length=10, on_delete=django.db.models.deletion.DO_NOTHING, to='wca.person')),
+                ('result', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='national_rankings', to='wca.result')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='nationalranking',
+            index=models.Index(fields=['event', 'rank_type', 'rank', 'result'], name='wca_national_ranking_idx'),
+        ),
+    ]
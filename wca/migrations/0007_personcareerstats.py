@@ -0,0 +1,29 @@
+# Generated by Django 3.2.19 on 2026-10-18 20:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wca', '0006_nationalranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonCareerStats',
+            fields=[
+                ('person', models.OneToOneField(db_constraint=False, max_length=10, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='career_stats', serialize=False, to='wca.person')),
+                ('competition_count', models.IntegerField(default=0)),
+                ('solve_count', models.IntegerField(default=0)),
+                ('national_records', models.IntegerField(default=0)),
+                ('continental_records', models.IntegerField(default=0)),
+                ('world_records', models.IntegerField(default=0)),
+                ('gold', models.IntegerField(default=0)),
+                ('silver', models.IntegerField(default=0)),
+                ('bronze', models.IntegerField(default=0)),
+                ('personal_records', models.JSONField(default=list)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.19 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wca', '0007_personcareerstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(condition=models.Q(('best__gt', 0)), fields=['event', 'person', 'best', 'id'], include=('country',), name='wca_result_event_best_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(condition=models.Q(('average__gt', 0)), fields=['event', 'person', 'average', 'id'], include=('country',), name='wca_result_event_average_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['person', 'competition'], name='wca_result_person_comp_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.db.models.manager import BaseManager
 
+from . import utils
+
 
 class Continent(models.Model):
     id = models.CharField(primary_key=True, max_length=50)
@@ -36,11 +38,14 @@ class PersonQuerySet(models.QuerySet):
         """
         Perform the query and return a single object matching the given
         keyword arguments.
+
+        A person has a row per ``subid``, one for each change of name or
+        country, so only the latest one is fetched.
         """
         clone = self.filter(*args, **kwargs)
 
         if self.query.can_filter() and not self.query.distinct_fields:
-            clone = clone.order_by()
+            clone = clone.order_by("-subid")[:1]
 
         num = len(clone)
 
@@ -108,8 +113,8 @@ class Competition(models.Model):
     longitude = models.IntegerField(blank=True, null=True)
 
     # Custom fields
-    start_date = models.DateField(blank=True, null=True)
-    end_date = models.DateField(blank=True, null=True)
+    start_date = models.DateField(blank=True, null=True, db_index=True)
+    end_date = models.DateField(blank=True, null=True, db_index=True)
     events = models.ManyToManyField(Event)
     organizers = models.ManyToManyField(Person, related_name="organized_comps")
     delegates = models.ManyToManyField(Person, related_name="delegated_comps")
@@ -212,6 +217,28 @@ class Result(models.Model):
     regional_single_record = models.CharField(max_length=3, blank=True, null=True)
     regional_average_record = models.CharField(max_length=3, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Best result of each person per event, as ranked by RankingQuery
+            models.Index(
+                fields=["event", "person", "best", "id"],
+                include=["country"],
+                condition=models.Q(best__gt=0),
+                name="wca_result_event_best_idx",
+            ),
+            models.Index(
+                fields=["event", "person", "average", "id"],
+                include=["country"],
+                condition=models.Q(average__gt=0),
+                name="wca_result_event_average_idx",
+            ),
+            # Career aggregates of a person
+            models.Index(
+                fields=["person", "competition"],
+                name="wca_result_person_comp_idx",
+            ),
+        ]
+
 
 class Scramble(models.Model):
     scramble_id = models.PositiveIntegerField()
@@ -233,7 +260,15 @@ class Scramble(models.Model):
     group_id = models.CharField(max_length=3)
     is_extra = models.IntegerField()
     scramble_num = models.IntegerField()
-    scramble = models.TextField()
+    # Compressed with utils.compress_scramble
+    scramble = models.BinaryField()
+
+    class Meta:
+        indexes = [models.Index(fields=["competition", "event", "round_type"])]
+
+    @property
+    def text(self):
+        return utils.decompress_scramble(self.scramble)
 
 
 class Championship(models.Model):
@@ -245,3 +280,77 @@ class Championship(models.Model):
         on_delete=models.DO_NOTHING,
     )
     championship_type = models.CharField(max_length=191)
+
+
+class NationalRanking(models.Model):
+    """Best result of each person per event, ranked, rebuilt after each import"""
+
+    RANK_TYPE_BEST = "best"
+    RANK_TYPE_AVERAGE = "average"
+    RANK_TYPE_CHOICES = (
+        (RANK_TYPE_BEST, "Single"),
+        (RANK_TYPE_AVERAGE, "Average"),
+    )
+
+    # Derived from the imported tables, which are swapped during an import,
+    # so the references are not enforced by the database
+    event = models.ForeignKey(
+        Event, max_length=6, db_constraint=False, on_delete=models.DO_NOTHING
+    )
+    rank_type = models.CharField(max_length=7, choices=RANK_TYPE_CHOICES)
+    rank = models.IntegerField()
+    person = models.ForeignKey(
+        Person, max_length=10, db_constraint=False, on_delete=models.DO_NOTHING
+    )
+    value = models.IntegerField()
+    result = models.ForeignKey(
+        Result,
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="national_rankings",
+    )
+    competition = models.ForeignKey(
+        Competition, max_length=32, db_constraint=False, on_delete=models.DO_NOTHING
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["event", "rank_type", "rank", "result"],
+                name="wca_national_ranking_idx",
+            )
+        ]
+
+
+class PersonCareerStats(models.Model):
+    """Career statistics of a person, rebuilt after each import"""
+
+    person = models.OneToOneField(
+        Person,
+        max_length=10,
+        primary_key=True,
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="career_stats",
+    )
+    competition_count = models.IntegerField(default=0)
+    solve_count = models.IntegerField(default=0)
+    national_records = models.IntegerField(default=0)
+    continental_records = models.IntegerField(default=0)
+    world_records = models.IntegerField(default=0)
+    gold = models.IntegerField(default=0)
+    silver = models.IntegerField(default=0)
+    bronze = models.IntegerField(default=0)
+    # Raw ranks of each event, in event order:
+    # [{"event_id", "format", "single": {...}, "average": {...}}]
+    personal_records = models.JSONField(default=list)
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of an import step, used to resume an interrupted import"""
+
+    step = models.CharField(primary_key=True, max_length=50)
+    export_date = models.CharField(max_length=50, blank=True, null=True)
+    chunk = models.IntegerField(blank=True, null=True)
+    is_done = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
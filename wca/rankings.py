@@ -0,0 +1,230 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import F, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+
+from .models import Competition, NationalRanking, Result
+
+PH_COUNTRY_ID = "Philippines"
+RANK_TYPES = ("best", "average")
+VALUES_FIELDS = (
+    "id",
+    "competition_id",
+    "person_id",
+    "person_name",
+    "best",
+    "average",
+    "value1",
+    "value2",
+    "value3",
+    "value4",
+    "value5",
+)
+
+
+class RankingQuery:
+    """
+    Best result of each person in an event, in ranking order, read with one
+    window query instead of a ``DISTINCT ON`` subquery and a second sort:
+
+        SELECT *, RANK() OVER (ORDER BY best) AS rank FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY person_id ORDER BY best, id
+            ) AS person_row FROM wca_result WHERE ...
+        ) WHERE person_row = 1
+
+    Like a queryset it is lazy: slicing and ``after`` are applied in SQL, so
+    only the requested rows are fetched. Every result carries its tie-aware
+    ``rank`` and its ``ranking_row`` number. With ``values()`` the rankings
+    are read as plain dicts.
+
+    The best result of each person is still picked from all of the results
+    of the event on every page, but after a position only the rows that
+    follow it are ranked and joined, with the ranks continuing from the rank
+    and row number that the position carries.
+    """
+
+    # Keyset of the ranking order, which pages continue from
+    ordering = ("value", "id")
+    # Fields of the position of a result, which later pages start after
+    position_fields = ("value", "id", "rank", "ranking_row")
+    # Columns of the ranked rows that are added to the results
+    ranked_columns = ("value", "rank", "ranking_row")
+
+    def __init__(
+        self,
+        event,
+        rank_type,
+        person_ids=None,
+        after=None,
+        limit=None,
+        values=False,
+    ):
+        if rank_type not in RANK_TYPES:
+            raise ValueError(f"Invalid rank type: {rank_type}")
+        self.event = event
+        self.rank_type = rank_type
+        self.person_ids = person_ids
+        self.position = after
+        self.limit = limit
+        self.as_values = values
+
+    def clone(self, **kwargs):
+        attrs = dict(
+            event=self.event,
+            rank_type=self.rank_type,
+            person_ids=self.person_ids,
+            after=self.position,
+            limit=self.limit,
+            values=self.as_values,
+        )
+        attrs.update(kwargs)
+        return self.__class__(**attrs)
+
+    def after(self, position):
+        """
+        Rankings following a position, given in the ``position_fields`` as
+        returned by ``get_position``.
+        """
+        if len(position) != len(self.position_fields):
+            raise ValueError(f"Invalid position: {position}")
+        return self.clone(after=tuple(position))
+
+    def values(self):
+        """
+        Rankings as dicts of the ``VALUES_FIELDS`` of the results, their
+        ``competition_name``, ``value`` and ``rank``, without model instances.
+        """
+        return self.clone(values=True)
+
+    def get_position(self, result):
+        if self.as_values:
+            return tuple(result[field] for field in self.position_fields)
+        return tuple(getattr(result, field) for field in self.position_fields)
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice) or k.start or k.step:
+            raise TypeError("RankingQuery only supports [:limit] slicing.")
+        return list(self.clone(limit=k.stop))
+
+    def __iter__(self):
+        try:
+            sql, params = self.get_sql()
+        except EmptyResultSet:
+            # Filtered on an empty list of persons
+            return iter([])
+        if self.as_values:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                columns = [column.name for column in cursor.description]
+                return iter([dict(zip(columns, row)) for row in cursor.fetchall()])
+        results = list(Result.objects.raw(sql, params))
+        prefetch_related_objects(results, "competition")
+        return iter(results)
+
+    def count(self):
+        try:
+            sql, params = self.clone(after=None).get_ranked_sql()
+        except EmptyResultSet:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM ({sql}) AS ranking", params)
+            (count,) = cursor.fetchone()
+        return count
+
+    def get_results_queryset(self):
+        results = Result.objects.filter(
+            country_id=PH_COUNTRY_ID,
+            event_id=self.event.id,
+            **{f"{self.rank_type}__gt": 0},
+        )
+        if self.person_ids is not None:
+            results = results.filter(person_id__in=self.person_ids)
+        # Only the columns that are ranked on, so that the sorts stay narrow
+        return results.values("id", self.rank_type).annotate(
+            person_row=Window(
+                RowNumber(),
+                partition_by=[F("person_id")],
+                order_by=[F(self.rank_type).asc(), F("id").asc()],
+            )
+        )
+
+    def get_ranked_sql(self):
+        """
+        The best result of each person following the position, with its rank
+        and row number. Rows tied with the position share its rank, and the
+        others are ranked after the rows up to it.
+        """
+        sql, params = self.get_results_queryset().query.sql_with_params()
+        rank = f"RANK() OVER (ORDER BY {self.rank_type})"
+        row = f"ROW_NUMBER() OVER (ORDER BY {self.rank_type}, id)"
+        where = "person_row = 1"
+        if self.position:
+            value, result_id, last_rank, last_row = self.position
+            rank = f"CASE WHEN {self.rank_type} = %s THEN %s ELSE %s + {rank} END"
+            row = f"%s + {row}"
+            where += f" AND ({self.rank_type}, id) > (%s, %s)"
+            params = (
+                (value, last_rank, last_row, last_row)
+                + tuple(params)
+                + (value, result_id)
+            )
+        return (
+            f"SELECT id, {self.rank_type} AS value, {rank} AS rank, "
+            f"{row} AS ranking_row FROM ({sql}) AS results WHERE {where}"
+        ), params
+
+    def get_sql(self):
+        """
+        The page of rankings, joined back to the full result rows only after
+        the position and limit are applied.
+        """
+        sql, params = self.get_ranked_sql()
+        ordering = ", ".join(self.ordering)
+        sql = f"SELECT * FROM ({sql}) AS ranking ORDER BY {ordering}"
+        if self.limit is not None:
+            sql += " LIMIT %s"
+            params += (self.limit,)
+        table = Result._meta.db_table
+        columns = f"{table}.*"
+        joins = f"JOIN {table} ON {table}.id = ranking.id"
+        if self.as_values:
+            competitions = Competition._meta.db_table
+            columns = ", ".join(f"{table}.{field}" for field in VALUES_FIELDS)
+            columns += f", {competitions}.name AS competition_name"
+            joins += (
+                f" LEFT JOIN {competitions} "
+                f"ON {competitions}.id = {table}.competition_id"
+            )
+        ranked = ", ".join(f"ranking.{column}" for column in self.ranked_columns)
+        return (
+            f"SELECT {columns}, {ranked} FROM ({sql}) AS ranking {joins} "
+            f"ORDER BY {', '.join(f'ranking.{field}' for field in self.ordering)}"
+        ), params
+
+
+class NationalRankingQuery(RankingQuery):
+    """
+    The national ranking read from the ``NationalRanking`` table, which the
+    import already ranked, so pages are index range scans over ``rank``.
+    """
+
+    ordering = ("rank", "id")
+    position_fields = ("rank", "id")
+    ranked_columns = ("value", "rank")
+
+    def __init__(self, event, rank_type, person_ids=None, **kwargs):
+        if person_ids is not None:
+            raise ValueError("National rankings are not filtered by person.")
+        super().__init__(event, rank_type, **kwargs)
+
+    def get_ranked_sql(self):
+        rankings = NationalRanking.objects.filter(
+            event_id=self.event.id, rank_type=self.rank_type
+        ).values("result_id", "value", "rank")
+        sql, params = rankings.query.sql_with_params()
+        sql = f"SELECT result_id AS id, value, rank FROM ({sql}) AS rankings"
+        if self.position:
+            sql += " WHERE (rank, result_id) > (%s, %s)"
+            params = tuple(params) + tuple(self.position)
+        return sql, params
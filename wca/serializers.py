@@ -1,9 +1,49 @@
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import Manager
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from . import api, models
-from .utils import parse_solves, parse_value
+from .events import get_events
+from .utils import (
+    DNF,
+    format_solves,
+    format_values,
+    parse_solves,
+    parse_value,
+)
+
+SOLVE_FIELDS = ("value1", "value2", "value3", "value4", "value5")
+
+
+def get_context_events(context):
+    """
+    Event registry of a serialization, looked up once and kept in its
+    context, since every lookup of the registry reads the data version.
+    """
+    if "events" not in context:
+        context["events"] = get_events()
+    return context["events"]
+
+
+def format_ranked_results(event, rank_type, values, solves):
+    """
+    Formatted values and solves of results of an event, given as an
+    ``EventInfo``, as ResultSerializer formats them for a ranking of
+    ``rank_type``.
+    """
+    values = np.array(values, dtype=np.int64)
+    solves = np.array(solves, dtype=np.int64).reshape(-1, len(SOLVE_FIELDS))
+    ao5 = None
+    if rank_type == "average" and event.ao5:
+        ao5 = values != DNF
+    return (
+        format_values(values, event.format, rank_type=rank_type),
+        format_solves(solves, event.format, ao5=ao5),
+    )
 
 
 class EventSerializer(serializers.ModelSerializer):
@@ -26,9 +66,44 @@ class ResultSolvesSerializer(serializers.Serializer):
     value5 = serializers.CharField(required=False, allow_null=True)
 
 
+class ResultListSerializer(serializers.ListSerializer):
+    """
+    Formats the values and solves of all the results at once per event, with
+    the batch formatters, instead of once per value. The formatted values
+    are kept by result pk for the child serializer, not on the results.
+    """
+
+    formatted = None
+
+    def to_representation(self, data):
+        results = list(data.all() if isinstance(data, Manager) else data)
+        rank_type = self.context.get("rank_type")
+        event_results = defaultdict(list)
+        for result in results:
+            event_results[result.event_id].append(result)
+        self.formatted = {}
+        try:
+            for same_event_results in event_results.values():
+                self.format_results(same_event_results, rank_type)
+            return super().to_representation(results)
+        finally:
+            self.formatted = None
+
+    def format_results(self, results, rank_type):
+        event = get_context_events(self.context)[results[0].event_id]
+        values, solves = format_ranked_results(
+            event,
+            rank_type,
+            [getattr(result, rank_type or "best") for result in results],
+            [[getattr(result, field) for field in SOLVE_FIELDS] for result in results],
+        )
+        for result, value, result_solves in zip(results, values, solves):
+            self.formatted[result.pk] = (value, dict(zip(SOLVE_FIELDS, result_solves)))
+
+
 class ResultSerializer(serializers.ModelSerializer):
     competition = CompetitionSerializer()
-    event = EventSerializer()
+    event = serializers.SerializerMethodField()
     value = serializers.SerializerMethodField()
     wca_id = serializers.SerializerMethodField()
     solves = serializers.SerializerMethodField()
@@ -36,23 +111,91 @@ class ResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Result
         fields = ("competition", "event", "value", "person_name", "wca_id", "solves")
+        list_serializer_class = ResultListSerializer
+
+    def get_event_info(self, obj):
+        return get_context_events(self.context)[obj.event_id]
+
+    def get_formatted(self, obj):
+        """Value and solves formatted by the list serializer, if any"""
+        formatted = getattr(self.parent, "formatted", None)
+        return formatted.get(obj.pk) if formatted else None
+
+    @extend_schema_field(EventSerializer)
+    def get_event(self, obj):
+        return self.get_event_info(obj).data
 
     def get_value(self, obj):
+        formatted = self.get_formatted(obj)
+        if formatted:
+            return formatted[0]
         rank_type = self.context.get("rank_type")
+        format = self.get_event_info(obj).format
         if rank_type == "average":
-            return parse_value(obj.average, obj.event.format, rank_type=rank_type)
-        return parse_value(obj.best, obj.event.format, rank_type=rank_type)
+            return parse_value(obj.average, format, rank_type=rank_type)
+        return parse_value(obj.best, format, rank_type=rank_type)
 
     def get_wca_id(self, obj):
-        return obj.person.id
+        return obj.person_id
 
     @extend_schema_field(ResultSolvesSerializer)
     def get_solves(self, obj):
+        formatted = self.get_formatted(obj)
+        if formatted:
+            return formatted[1]
         rank_type = self.context.get("rank_type")
-        solves = parse_solves(obj, rank_type)
+        solves = parse_solves(obj, rank_type, self.get_event_info(obj))
         return ResultSolvesSerializer(solves).data
 
 
+class RankingSerializer:
+    """
+    Fast path of ``ResultSerializer(many=True)`` for the rows of a
+    ``RankingQuery.values()`` of an event, given as an ``EventInfo``. It
+    builds the same JSON as plain dicts, with one event dict shared by all
+    the rows instead of serializing the event per row.
+    """
+
+    def __init__(self, rows, event, rank_type):
+        self.rows = rows
+        self.event = event
+        self.rank_type = rank_type
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        event = self.event.data
+        values, solves = format_ranked_results(
+            self.event,
+            self.rank_type,
+            [row[self.rank_type] for row in rows],
+            [[row[field] for field in SOLVE_FIELDS] for row in rows],
+        )
+        return [
+            {
+                "competition": (
+                    {"id": row["competition_id"], "name": row["competition_name"]}
+                    if row["competition_id"] is not None
+                    else None
+                ),
+                "event": event,
+                "value": value,
+                "person_name": row["person_name"],
+                "wca_id": row["person_id"],
+                "solves": dict(zip(SOLVE_FIELDS, row_solves)),
+            }
+            for row, value, row_solves in zip(rows, values, solves)
+        ]
+
+
+class ScrambleSerializer(serializers.ModelSerializer):
+    scramble = serializers.CharField(source="text")
+
+    class Meta:
+        model = models.Scramble
+        fields = ("group_id", "is_extra", "scramble_num", "scramble")
+
+
 class PersonSerializer(serializers.ModelSerializer):
     gender = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
@@ -74,7 +217,7 @@ class PersonSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_avatar(self, obj):
-        return api.get_avatar(obj)
+        return api.get_avatar(obj.id)
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_career(self, obj):
@@ -1,7 +1,15 @@
 import factory
 from factory.django import DjangoModelFactory
 
-from ..models import Continent, Country, Event, Person
+from ..models import (
+    Competition,
+    Continent,
+    Country,
+    Event,
+    Person,
+    Result,
+    RoundType,
+)
 
 
 class ContinentFactory(DjangoModelFactory):
@@ -14,6 +22,7 @@ class ContinentFactory(DjangoModelFactory):
 
     class Meta:
         model = Continent
+        django_get_or_create = ("id",)
 
 
 class CountryFactory(DjangoModelFactory):
@@ -24,6 +33,7 @@ class CountryFactory(DjangoModelFactory):
 
     class Meta:
         model = Country
+        django_get_or_create = ("id",)
 
 
 class EventFactory(DjangoModelFactory):
@@ -35,6 +45,7 @@ class EventFactory(DjangoModelFactory):
 
     class Meta:
         model = Event
+        django_get_or_create = ("id",)
 
 
 class PersonFactory(DjangoModelFactory):
@@ -46,3 +57,53 @@ class PersonFactory(DjangoModelFactory):
 
     class Meta:
         model = Person
+        django_get_or_create = ("id",)
+
+
+class RoundTypeFactory(DjangoModelFactory):
+    id = "f"
+    rank = 199
+    name = "Final"
+    cell_name = "Final"
+    final = 1
+
+    class Meta:
+        model = RoundType
+        django_get_or_create = ("id",)
+
+
+class CompetitionFactory(DjangoModelFactory):
+    id = "MC2021"
+    name = "Manila Cubing 2021"
+    city_name = "Manila"
+    country = factory.SubFactory(CountryFactory)
+    year = 2021
+    month = 5
+    day = 1
+    end_month = 5
+    end_day = 2
+    cell_name = "Manila Cubing 2021"
+
+    class Meta:
+        model = Competition
+        django_get_or_create = ("id",)
+
+
+class ResultFactory(DjangoModelFactory):
+    competition = factory.SubFactory(CompetitionFactory)
+    event = factory.SubFactory(EventFactory)
+    round_type = factory.SubFactory(RoundTypeFactory)
+    pos = 1
+    best = 700
+    average = factory.SelfAttribute("best")
+    person = factory.SubFactory(PersonFactory)
+    person_name = factory.SelfAttribute("person.name")
+    country = factory.SelfAttribute("person.country")
+    value1 = factory.SelfAttribute("best")
+    value2 = factory.SelfAttribute("best")
+    value3 = factory.SelfAttribute("best")
+    value4 = factory.SelfAttribute("best")
+    value5 = factory.SelfAttribute("best")
+
+    class Meta:
+        model = Result
@@ -0,0 +1,60 @@
+import pytest
+
+from wca.api import bump_data_version
+from wca.events import get_event_info, get_events
+from wca.models import Event, Format
+from wca.serializers import EventSerializer
+
+
+@pytest.fixture
+def formats():
+    Format.objects.create(
+        id="a",
+        name="Average of 5",
+        sort_by="average",
+        sort_by_second="single",
+        expected_solve_count=5,
+        trim_fastest_n=1,
+        trim_slowest_n=1,
+    )
+
+
+@pytest.mark.django_db
+def test_events(event, formats, locmem_cache, django_assert_num_queries):
+    Event.objects.create(
+        id="333mbf", name="3x3x3 Multi-Blind", rank=180, format="multi"
+    )
+
+    with django_assert_num_queries(2):
+        events = get_events()
+    with django_assert_num_queries(0):
+        assert get_events() is events
+        assert get_event_info("444") is None
+
+    assert list(events) == ["333", "333mbf"]
+    assert events["333"].data == EventSerializer(event).data
+    assert events["333"][:8] == ("333", "time", True, False, "a", 5, 1, 1)
+    assert events["333mbf"][:8] == (
+        "333mbf",
+        "multi",
+        False,
+        False,
+        None,
+        None,
+        None,
+        None,
+    )
+    with pytest.raises(TypeError):
+        events["444"] = events["333"]
+
+
+@pytest.mark.django_db
+def test_events_follow_data_version(event, locmem_cache, django_assert_num_queries):
+    assert get_event_info("333").data["name"] == event.name
+
+    event.name = "Rubik's Cube"
+    event.save()
+    assert get_event_info("333").data["name"] != "Rubik's Cube"
+
+    bump_data_version()
+    assert get_event_info("333").data["name"] == "Rubik's Cube"
@@ -0,0 +1,541 @@
+import threading
+import time
+import zipfile
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.urls import reverse
+
+from wca.management.commands import import_wca_data
+from wca.api import get_data_version, get_export_date
+from wca.loader import StagingTable
+from wca.models import (
+    Competition,
+    Continent,
+    Event,
+    ImportCheckpoint,
+    NationalRanking,
+    Person,
+    PersonCareerStats,
+    RanksSingle,
+    Result,
+    Scramble,
+)
+from wca.rankings import NationalRankingQuery
+
+EXPORT = {
+    "WCA_export_Continents.tsv": [
+        "id\tname\trecordName\tlatitude\tlongitude\tzoom",
+        "_Asia\tAsia\tAsR\t34364439\t108330700\t2",
+    ],
+    "WCA_export_Countries.tsv": [
+        "id\tname\tcontinentId\tiso2",
+        "Philippines\tPhilippines\t_Asia\tPH",
+        "Japan\tJapan\t_Asia\tJP",
+    ],
+    "WCA_export_Events.tsv": [
+        "id\tname\trank\tformat\tcellName",
+        "333\t3x3x3 Cube\t10\ttime\t3x3x3 Cube",
+        "333fm\t3x3x3 Fewest Moves\t80\tnumber\t3x3x3 Fewest Moves",
+    ],
+    "WCA_export_Formats.tsv": [
+        "id\tname\tsort_by\tsort_by_second\texpected_solve_count"
+        "\ttrim_fastest_n\ttrim_slowest_n",
+        "a\tAverage of 5\taverage\tsingle\t5\t1\t1",
+        "m\tMean of 3\taverage\tsingle\t3\t0\t0",
+    ],
+    "WCA_export_RoundTypes.tsv": [
+        "id\trank\tname\tcellName\tfinal",
+        "1\t10\tFirst round\tFirst\t0",
+        "f\t199\tFinal\tFinal\t1",
+    ],
+    "WCA_export_Competitions.tsv": [
+        "id\tname\tcityName\tcountryId\tinformation\tyear\tmonth\tday\tendMonth"
+        "\tendDay\tcancelled\teventSpecs\twcaDelegate\torganiser\tvenue"
+        "\tvenueAddress\tvenueDetails\texternal_website\tcellName\tlatitude"
+        "\tlongitude",
+        'MC2021\tManila Cubing 2021\tManila\tPhilippines\t"Tabs\tand\nnewlines"'
+        "\t2021\t12\t30\t1\t2\t0\t333 333fm"
+        "\t[{Juan dela Cruz}{mailto:juan@example.com}]"
+        "\t[{Maria Santos}{mailto:maria@example.com}]"
+        "\tSM Mall\tManila\t\t\tManila Cubing 2021\t14599512\t120984222",
+    ],
+    "WCA_export_Persons.tsv": [
+        "id\tsubid\tname\tcountryId\tgender",
+        "2021DELA01\t1\tJuan dela Cruz\tPhilippines\tm",
+        "2021SANT01\t1\tMaria Santos\tPhilippines\tf",
+        "2021YAMA01\t1\tTaro Yamada\tJapan\tm",
+    ],
+    "WCA_export_RanksSingle.tsv": [
+        "personId\teventId\tbest\tworldRank\tcontinentRank\tcountryRank",
+        "2021DELA01\t333\t651\t100\t50\t1",
+        "2021SANT01\t333\t702\t120\t60\t2",
+        "2021YAMA01\t333\t600\t90\t40\t1",
+    ],
+    "WCA_export_RanksAverage.tsv": [
+        "personId\teventId\tbest\tworldRank\tcontinentRank\tcountryRank",
+        "2021DELA01\t333\t733\t100\t50\t1",
+    ],
+    "WCA_export_Results.tsv": [
+        "competitionId\teventId\troundTypeId\tpos\tbest\taverage\tpersonName"
+        "\tpersonId\tpersonCountryId\tformatId\tvalue1\tvalue2\tvalue3\tvalue4"
+        "\tvalue5\tregionalSingleRecord\tregionalAverageRecord",
+        "MC2021\t333\tf\t1\t651\t733\tJuan dela Cruz\t2021DELA01\tPhilippines"
+        "\ta\t793\t651\t733\t697\t832\tNR\tNR",
+        "MC2021\t333\tf\t2\t702\t801\tMaria Santos\t2021SANT01\tPhilippines"
+        "\ta\t702\t-1\t790\t812\t801\t\t",
+        "MC2021\t333fm\tf\t1\t25\t2833\tJuan dela Cruz\t2021DELA01\tPhilippines"
+        "\tm\t25\t30\t30\t0\t0\t\t",
+        "MC2021\t333\tf\t3\t600\t650\tTaro Yamada\t2021YAMA01\tJapan"
+        "\ta\t600\t650\t640\t660\t700\t\t",
+    ],
+    "WCA_export_Scrambles.tsv": [
+        "scrambleId\tcompetitionId\teventId\troundTypeId\tgroupId\tisExtra"
+        "\tscrambleNum\tscramble",
+        "1\tMC2021\t333\tf\tA\t0\t1\tF2 D' B2 U2 F2 R2 U' L2 D' R2",
+        "2\tMC2021\t333\tf\tA\t1\t1\tR U R' U'",
+        "3\tOther2021\t333\tf\tA\t0\t1\tR U R' U'",
+    ],
+    "WCA_export_championships.tsv": [
+        "id\tcompetition_id\tchampionship_type",
+        "1\tMC2021\tPH",
+    ],
+}
+
+
+@pytest.fixture
+def wca_export(tmp_path, monkeypatch):
+    for filename, lines in EXPORT.items():
+        tmp_path.joinpath(filename).write_text("\n".join(lines) + "\n")
+    tmp_path.joinpath("metadata.json").write_text('{"export_date": "2021-05-01"}')
+    monkeypatch.setattr(import_wca_data, "DUMP_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("args", [[], ["--row-by-row"]])
+def test_import_wca_data(wca_export, args):
+    call_command("import_wca_data", "--force", *args)
+
+    assert Continent.objects.get(id="_Asia").record_name == "AsR"
+    assert list(Person.objects.order_by("id").values_list("id", flat=True)) == [
+        "2021DELA01",
+        "2021SANT01",
+    ]
+    competition = Competition.objects.get(id="MC2021")
+    assert competition.information == "Tabs\tand\nnewlines"
+    assert str(competition.start_date) == "2021-12-30"
+    assert str(competition.end_date) == "2022-01-02"
+    assert set(competition.events.values_list("id", flat=True)) == {"333", "333fm"}
+    assert list(competition.delegates.values_list("id", flat=True)) == ["2021DELA01"]
+    assert list(competition.organizers.values_list("id", flat=True)) == ["2021SANT01"]
+    assert RanksSingle.objects.count() == 2
+    assert Result.objects.count() == 3
+    result = Result.objects.get(person_id="2021SANT01")
+    assert result.value2 == -1
+    assert result.regional_single_record is None
+    assert [scramble.text for scramble in Scramble.objects.order_by("id")] == [
+        "F2 D' B2 U2 F2 R2 U' L2 D' R2",
+        "R U R' U'",
+    ]
+
+
+@pytest.mark.django_db
+def test_import_wca_data_national_rankings(wca_export, api_client):
+    results = wca_export.joinpath("WCA_export_Results.tsv")
+    results.write_text(
+        results.read_text().replace("\t702\t801\tMaria", "\t651\t801\tMaria")
+    )
+    call_command("import_wca_data", "--force")
+
+    rankings = NationalRanking.objects.filter(event_id="333").order_by(
+        "rank_type", "rank", "person_id"
+    )
+    assert list(rankings.values_list("rank_type", "rank", "person_id", "value")) == [
+        ("average", 1, "2021DELA01", 733),
+        ("average", 2, "2021SANT01", 801),
+        ("best", 1, "2021DELA01", 651),
+        ("best", 1, "2021SANT01", 651),
+    ]
+    url = reverse("api:national-average-ranking", kwargs={"event_id": "333"})
+    response = api_client.get(url)
+    assert [result["wca_id"] for result in response.json()] == [
+        "2021DELA01",
+        "2021SANT01",
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("args", [[], ["--row-by-row"], ["--delta"]])
+def test_import_wca_data_national_rankings_follow_results(
+    wca_export, monkeypatch, args
+):
+    call_command("import_wca_data", "--force")
+    results = wca_export.joinpath("WCA_export_Results.tsv")
+    results.write_text(results.read_text().replace("\t702\t801\t", "\t640\t801\t"))
+
+    # The step after the results swap fails, before any later step has run
+    def import_championships(self):
+        raise ConnectionError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(
+        import_wca_data.Command, "import_championships", import_championships
+    )
+    with pytest.raises(ConnectionError):
+        call_command("import_wca_data", "--force", *args)
+
+    ranking = NationalRankingQuery(Event(id="333"), "best")
+    assert [(result.person_id, result.best) for result in ranking] == [
+        ("2021SANT01", 640),
+        ("2021DELA01", 651),
+    ]
+
+
+@pytest.mark.django_db
+def test_import_wca_data_scrambles_of_ph_competitors(wca_export):
+    competitions = wca_export.joinpath("WCA_export_Competitions.tsv")
+    competition = EXPORT["WCA_export_Competitions.tsv"][1]
+    with competitions.open("a") as f:
+        for competition_id in ["TC2021", "OC2021"]:
+            f.write(
+                competition.replace("MC2021", competition_id).replace(
+                    "\tPhilippines\t", "\tJapan\t"
+                )
+                + "\n"
+            )
+    results = wca_export.joinpath("WCA_export_Results.tsv")
+    with results.open("a") as f:
+        f.write(EXPORT["WCA_export_Results.tsv"][1].replace("MC2021", "TC2021") + "\n")
+    scrambles = wca_export.joinpath("WCA_export_Scrambles.tsv")
+    with scrambles.open("a") as f:
+        f.write("4\tTC2021\t333\tf\tA\t0\t1\tR U R' U'\n")
+        f.write("5\tOC2021\t333\tf\tA\t0\t1\tR U R' U'\n")
+
+    call_command("import_wca_data", "--force")
+
+    # Competitions abroad only have scrambles if Filipinos competed there
+    assert Competition.objects.filter(id="OC2021").exists()
+    assert list(
+        Scramble.objects.order_by("competition_id")
+        .values_list("competition_id", flat=True)
+        .distinct()
+    ) == ["MC2021", "TC2021"]
+
+
+@pytest.mark.django_db
+def test_import_wca_data_career_stats(wca_export, api_client):
+    call_command("import_wca_data", "--force")
+
+    url = reverse("api:person-retrieve", kwargs={"wca_id": "2021DELA01"})
+    career = api_client.get(url).json()["career"]
+    assert career == {
+        "competition_count": 1,
+        "solve_count": 8,
+        "personal_records": {
+            "333": {
+                "single": {
+                    "best": "6.51",
+                    "world_rank": 100,
+                    "continent_rank": 50,
+                    "country_rank": 1,
+                },
+                "average": {
+                    "best": "7.33",
+                    "world_rank": 100,
+                    "continent_rank": 50,
+                    "country_rank": 1,
+                },
+            }
+        },
+        "records": {"national": 2, "continental": 0, "world": 0, "total": 2},
+        "medals": {"gold": 2, "silver": 0, "bronze": 0, "total": 2},
+    }
+    stats = PersonCareerStats.objects.get(person_id="2021SANT01")
+    assert stats.personal_records[0]["single"]["best"] == 702
+    assert stats.personal_records[0]["average"] is None
+    assert stats.silver == 1
+
+
+@pytest.mark.django_db
+def test_import_wca_data_is_repeatable(wca_export, locmem_cache):
+    call_command("import_wca_data", "--force")
+    version = get_data_version()
+    call_command("import_wca_data", "--force")
+
+    assert get_data_version() == version + 1
+    assert get_export_date().isoformat() == "2021-05-01T00:00:00+00:00"
+
+    assert Person.objects.count() == 2
+    assert Result.objects.count() == 3
+    assert Competition.events.through.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_import_wca_data_swaps_staging_tables(wca_export):
+    def get_indexes():
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, "wca_result")
+
+    indexes = get_indexes()
+    call_command("import_wca_data", "--force")
+
+    assert get_indexes().keys() == indexes.keys()
+    assert "wca_result_staging" not in connection.introspection.table_names()
+    assert Result.objects.count() == 3
+    Result.objects.create(
+        competition_id="MC2021",
+        event_id="333",
+        round_type_id="f",
+        pos=4,
+        best=1000,
+        average=1100,
+        person_id="2021SANT01",
+        country_id="Philippines",
+        format_id="a",
+        value1=1000,
+        value2=1000,
+        value3=1000,
+        value4=1000,
+        value5=1000,
+    )
+
+
+@pytest.mark.django_db
+def test_import_wca_data_stages_national_rankings(wca_export, monkeypatch):
+    calls = []
+    swap_in = StagingTable.swap_in
+    build_national_rankings = import_wca_data.Command.build_national_rankings
+
+    def record_swap_in(self, *args):
+        calls.append(("swap", self.table))
+        return swap_in(self, *args)
+
+    def record_build_national_rankings(self, *args):
+        calls.append(("build", *args))
+        return build_national_rankings(self, *args)
+
+    monkeypatch.setattr(StagingTable, "swap_in", record_swap_in)
+    monkeypatch.setattr(
+        import_wca_data.Command,
+        "build_national_rankings",
+        record_build_national_rankings,
+    )
+    call_command("import_wca_data", "--force")
+
+    # Built from the staging results before the swap, not inside it
+    start = calls.index(("build", "wca_result_staging", "wca_nationalranking_staging"))
+    assert calls[start + 1 : start + 3] == [
+        ("swap", "wca_result"),
+        ("swap", "wca_nationalranking"),
+    ]
+    assert "wca_nationalranking_staging" not in connection.introspection.table_names()
+    assert NationalRanking.objects.count() == 6
+    assert set(NationalRanking.objects.values_list("result_id", flat=True)) <= set(
+        Result.objects.values_list("id", flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_import_wca_data_delta(wca_export, caplog):
+    call_command("import_wca_data", "--force")
+    unchanged = Result.objects.get(person_id="2021DELA01", event_id="333fm")
+
+    results = wca_export.joinpath("WCA_export_Results.tsv")
+    lines = EXPORT["WCA_export_Results.tsv"]
+    results.write_text(
+        "\n".join(
+            [
+                lines[0],
+                lines[1].replace("\t651\t733\t", "\t640\t733\t"),
+                lines[3],
+                "MC2021\t333\t1\t1\t800\t900\tMaria Santos\t2021SANT01"
+                "\tPhilippines\ta\t800\t900\t900\t900\t1000\t\t",
+            ]
+        )
+        + "\n"
+    )
+    with caplog.at_level("INFO"):
+        call_command("import_wca_data", "--force", "--delta")
+
+    assert "wca_result: 1 inserted, 1 updated, 1 deleted" in caplog.text
+    assert "wca_person: 0 inserted, 0 updated, 0 deleted" in caplog.text
+    assert "wca_competition: 0 inserted, 0 updated, 0 deleted" in caplog.text
+    assert Result.objects.count() == 3
+    assert Result.objects.get(pk=unchanged.pk).best == 25
+    assert Result.objects.get(person_id="2021DELA01", event_id="333").best == 640
+    assert not Result.objects.filter(person_id="2021SANT01", round_type_id="f")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("args", [[], ["--delta"]])
+def test_import_wca_data_without_rows(wca_export, monkeypatch, args):
+    call_command("import_wca_data", "--force")
+    for filename in ["WCA_export_Persons.tsv", "WCA_export_Results.tsv"]:
+        wca_export.joinpath(filename).write_text(EXPORT[filename][0] + "\n")
+
+    # Depending on the pandas version, a file without rows has one empty
+    # chunk or none at all
+    read_tsv_chunks = import_wca_data.Command.read_tsv_chunks
+
+    def read_non_empty_chunks(self, *args, **kwargs):
+        for chunk in read_tsv_chunks(self, *args, **kwargs):
+            if not chunk.empty:
+                yield chunk
+
+    monkeypatch.setattr(
+        import_wca_data.Command, "read_tsv_chunks", read_non_empty_chunks
+    )
+    call_command("import_wca_data", "--force", *args)
+
+    assert RanksSingle.objects.count() == 0
+    assert Result.objects.count() == 0
+    assert NationalRanking.objects.count() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("args", [[], ["--delta"]])
+def test_import_wca_data_in_chunks(wca_export, monkeypatch, args):
+    monkeypatch.setattr(import_wca_data, "CHUNK_SIZE", 1)
+    call_command("import_wca_data", "--force", *args)
+
+    assert Person.objects.count() == 2
+    assert RanksSingle.objects.count() == 2
+    assert Result.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_import_wca_data_from_archive(wca_export, tmp_path_factory, caplog):
+    archive = tmp_path_factory.mktemp("archive").joinpath("WCA_export.tsv.zip")
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        for filename in EXPORT:
+            zip_file.write(wca_export.joinpath(filename), filename)
+            wca_export.joinpath(filename).unlink()
+        zip_file.writestr("metadata.json", '{"export_date": "2021-05-01"}')
+
+    call_command("import_wca_data", "--archive", str(archive))
+
+    assert Result.objects.count() == 3
+    assert "2021-05-01" in wca_export.joinpath("previous_metadata.json").read_text()
+    with caplog.at_level("INFO"):
+        call_command("import_wca_data", "--archive", str(archive))
+    assert "Data is up-to-date." in caplog.text
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_wca_data_in_parallel(wca_export, caplog):
+    with caplog.at_level("INFO"):
+        call_command("import_wca_data", "--force", "--jobs", "4")
+
+    assert Person.objects.count() == 2
+    assert RanksSingle.objects.count() == 2
+    assert Result.objects.count() == 3
+    # Steps run side by side, so only the process peak is reported
+    assert "rows/s, peak memory" not in caplog.text
+    assert "process peak memory" in caplog.text
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_wca_data_swaps_one_at_a_time(wca_export, monkeypatch):
+    lock = threading.Lock()
+    active = []
+    overlaps = []
+    swap_in = StagingTable.swap_in
+
+    def slow_swap_in(self, *args):
+        with lock:
+            active.append(self.table)
+            overlaps.append(len(active) > 1)
+        time.sleep(0.05)
+        try:
+            return swap_in(self, *args)
+        finally:
+            with lock:
+                active.remove(self.table)
+
+    monkeypatch.setattr(StagingTable, "swap_in", slow_swap_in)
+    call_command("import_wca_data", "--force", "--jobs", "4")
+
+    assert overlaps and not any(overlaps)
+    assert Result.objects.count() == 3
+    assert Scramble.objects.count() == 2
+
+
+@pytest.mark.parametrize("jobs", ["0", "-1"])
+def test_import_wca_data_invalid_jobs(wca_export, jobs):
+    with pytest.raises(CommandError, match="--jobs must be at least 1"):
+        call_command("import_wca_data", "--force", "--jobs", jobs)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_wca_data_from_step(wca_export, caplog):
+    call_command("import_wca_data", "--force")
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        call_command("import_wca_data", "--force", "--step", "10", "--jobs", "2")
+
+    assert "import_persons" not in caplog.text
+    assert "import_results: 3 rows" in caplog.text
+    assert "import_championships: 1 rows" in caplog.text
+
+
+@pytest.mark.django_db
+def test_import_wca_data_resume(wca_export, monkeypatch, caplog):
+    copy = StagingTable.copy
+
+    def failing_copy(self, df):
+        if self.table == "wca_result" and ImportCheckpoint.objects.filter(
+            step="import_results", chunk=0
+        ):
+            raise ConnectionError("server closed the connection unexpectedly")
+        return copy(self, df)
+
+    monkeypatch.setattr(import_wca_data, "CHUNK_SIZE", 1)
+    monkeypatch.setattr(StagingTable, "copy", failing_copy)
+    with pytest.raises(ConnectionError):
+        call_command("import_wca_data", "--force")
+
+    assert Result.objects.count() == 0
+    assert ImportCheckpoint.objects.get(step="import_results").chunk == 0
+
+    monkeypatch.setattr(StagingTable, "copy", copy)
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        call_command("import_wca_data", "--force", "--resume")
+
+    assert "import_persons" not in caplog.text
+    assert "resuming import_results from chunk 2" in caplog.text
+    assert "import_results: 3 rows" in caplog.text
+    assert Result.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_import_wca_data_resume_failed_swap(wca_export, monkeypatch, caplog):
+    build_national_rankings = import_wca_data.Command.build_national_rankings
+
+    def failing_build_national_rankings(self, *args):
+        raise ConnectionError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(
+        import_wca_data.Command,
+        "build_national_rankings",
+        failing_build_national_rankings,
+    )
+    with pytest.raises(ConnectionError):
+        call_command("import_wca_data", "--force")
+
+    # The indexes built for the failed swap are left on the staging table
+    with connection.cursor() as cursor:
+        assert connection.introspection.get_constraints(cursor, "wca_result_staging")
+
+    monkeypatch.setattr(
+        import_wca_data.Command, "build_national_rankings", build_national_rankings
+    )
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        call_command("import_wca_data", "--force", "--resume")
+
+    assert "import_results: 3 rows" in caplog.text
+    assert Result.objects.count() == 3
+    assert NationalRanking.objects.count() == 6
@@ -0,0 +1,32 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from wca.models import Person, Result
+
+
+@pytest.mark.django_db
+def test_person_get_fetches_latest_subid(person):
+    with CaptureQueriesContext(connection) as queries:
+        assert Person.objects.get(id=person.id) == person
+
+    (query,) = queries.captured_queries
+    assert 'ORDER BY "wca_person"."subid" DESC LIMIT 1' in query["sql"]
+
+
+@pytest.mark.django_db
+def test_person_get_does_not_exist():
+    with pytest.raises(Person.DoesNotExist):
+        Person.objects.get(id="2021NONE01")
+
+
+@pytest.mark.django_db
+def test_person_competitions_use_index(person):
+    competitions = Result.objects.filter(person=person).values("competition").distinct()
+    sql, params = competitions.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN {sql}", params)
+        plan = "\n".join(line for (line,) in cursor.fetchall())
+
+    assert "wca_result_person_comp_idx" in plan
@@ -0,0 +1,149 @@
+import pytest
+from django.db import connection
+
+from wca.management.commands import import_wca_data
+from wca.events import get_event_info
+from wca.rankings import NationalRankingQuery, RankingQuery
+from wca.serializers import RankingSerializer, ResultSerializer
+from wca.tests.factories import PersonFactory, ResultFactory
+
+
+@pytest.fixture
+def results(competition, event, round_type):
+    results = []
+    for wca_id, bests in [
+        ("2021AAAA01", [900, 700]),
+        ("2021BBBB01", [650]),
+        ("2021CCCC01", [650, -1]),
+        ("2021DDDD01", [800]),
+    ]:
+        person = PersonFactory(id=wca_id, country=competition.country)
+        for best in bests:
+            results.append(
+                ResultFactory(
+                    competition=competition,
+                    event=event,
+                    round_type=round_type,
+                    best=best,
+                    average=0,
+                    person=person,
+                )
+            )
+    return results
+
+
+@pytest.mark.django_db
+def test_ranking_query(results, event, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        ranking = [
+            (result.person_id, result.best, result.rank, result.event_id)
+            for result in RankingQuery(event, "best")
+        ]
+
+    assert ranking == [
+        ("2021BBBB01", 650, 1, "333"),
+        ("2021CCCC01", 650, 1, "333"),
+        ("2021AAAA01", 700, 3, "333"),
+        ("2021DDDD01", 800, 4, "333"),
+    ]
+    assert RankingQuery(event, "best").count() == 4
+    assert not list(RankingQuery(event, "average"))
+
+
+@pytest.mark.django_db
+def test_ranking_query_limit_and_after(results, event):
+    ranking = RankingQuery(event, "best")
+    first, second = ranking[:2]
+    rest = ranking.after(ranking.get_position(second))
+
+    assert [result.person_id for result in rest] == ["2021AAAA01", "2021DDDD01"]
+    assert [result.rank for result in rest] == [3, 4]
+    assert [result.ranking_row for result in rest] == [3, 4]
+
+    # The rank of a tie carries over to the next page
+    tied = ranking.after(ranking.get_position(first))[:1]
+    assert [(result.person_id, result.rank) for result in tied] == [("2021CCCC01", 1)]
+    with pytest.raises(ValueError):
+        ranking.after((second.best, second.id))
+
+
+@pytest.mark.django_db
+def test_ranking_query_after_only_ranks_later_rows(results, event):
+    ranking = RankingQuery(event, "best")
+    first = ranking[:1][0]
+    sql, params = ranking.after(ranking.get_position(first)).get_ranked_sql()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}", params)
+        plan = [line for (line,) in cursor.fetchall()]
+    # The position filters the best results before they are ranked
+    assert "WindowAgg" in plan[0]
+    assert any("Filter" in line and "ROW(" in line for line in plan[1:])
+
+
+@pytest.mark.django_db
+def test_ranking_query_person_ids(results, event):
+    ranking = RankingQuery(event, "best", person_ids=["2021AAAA01", "2021DDDD01"])
+    assert [(result.person_id, result.rank) for result in ranking] == [
+        ("2021AAAA01", 1),
+        ("2021DDDD01", 2),
+    ]
+    assert not list(RankingQuery(event, "best", person_ids=[]))
+    assert RankingQuery(event, "best", person_ids=[]).count() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("query_class", [RankingQuery, NationalRankingQuery])
+def test_ranking_query_values(results, event, query_class):
+    import_wca_data.Command().build_national_rankings()
+    ranking = query_class(event, "best")
+    rows = list(ranking.values())
+
+    assert [(row["person_id"], row["rank"]) for row in rows] == [
+        (result.person_id, result.rank) for result in ranking
+    ]
+    assert ranking.values().get_position(rows[1]) == ranking.get_position(
+        list(ranking)[1]
+    )
+    assert RankingSerializer(rows, get_event_info(event.id), "best").data == (
+        ResultSerializer(list(ranking), many=True, context={"rank_type": "best"}).data
+    )
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        # The test tables are tiny, so a sequential scan would always win
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN {sql}", params)
+        return "\n".join(line for (line,) in cursor.fetchall())
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("rank_type", ["best", "average"])
+def test_ranking_query_uses_partial_index(results, event, rank_type):
+    plan = explain(*RankingQuery(event, rank_type).clone(limit=100).get_sql())
+    assert f"wca_result_event_{rank_type}_idx" in plan
+
+
+@pytest.mark.django_db
+def test_national_ranking_query(results, event):
+    import_wca_data.Command().build_national_rankings()
+    ranking = NationalRankingQuery(event, "best")
+
+    assert [(result.person_id, result.rank) for result in ranking] == [
+        ("2021BBBB01", 1),
+        ("2021CCCC01", 1),
+        ("2021AAAA01", 3),
+        ("2021DDDD01", 4),
+    ]
+    first, second = ranking[:2]
+    assert [result.person_id for result in ranking.after((second.rank, second.id))] == [
+        "2021AAAA01",
+        "2021DDDD01",
+    ]
+
+
+@pytest.mark.django_db
+def test_national_ranking_query_uses_index(event):
+    plan = explain(*NationalRankingQuery(event, "best").clone(limit=100).get_sql())
+    assert "wca_national_ranking_idx" in plan
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from wca.serializers import ResultSerializer
+from wca.tests.factories import ResultFactory
+from wca.utils import (
+    format_solves,
+    format_values,
+    parse_ao5_solves,
+    parse_solves,
+    parse_value,
+)
+
+TIMES = [-2, -1, 0, 1, 5, 99, 100, 105, 1234, 5999, 6000, 6005, 6100, 360000, 366005]
+MULTI = [-1, 0, 970360001, 970000001, 999999900, 1009999900, 1020300000, 123]
+
+
+@pytest.mark.parametrize(
+    "values,format",
+    [(TIMES, "time"), (TIMES, "number"), (MULTI, "multi"), (TIMES, "unknown")],
+)
+@pytest.mark.parametrize("rank_type", ["best", "average"])
+def test_format_values(values, format, rank_type):
+    assert list(format_values(np.array(values), format, rank_type)) == [
+        parse_value(value, format, rank_type=rank_type) for value in values
+    ]
+
+
+@pytest.mark.parametrize(
+    "solves",
+    [
+        [900, 700, 800, 1000, 600],
+        [700, 700, 700, 700, 700],
+        [-1, 700, 800, 900, 1000],
+        [700, 800, 900, 1000, -1],
+        [700, -2, 800, -1, 900],
+        [-1, -1, 800, 900, 1000],
+        [0, 700, 800, 900, 1000],
+    ],
+)
+def test_format_solves_ao5(solves):
+    result = SimpleNamespace(
+        **{f"value{index + 1}": solve for index, solve in enumerate(solves)},
+        event=SimpleNamespace(id="333", format="time"),
+    )
+    formatted = format_solves(np.array([solves]), "time", ao5=np.array([True]))
+    assert list(formatted[0]) == list(parse_ao5_solves(result).values())
+
+    formatted = format_solves(np.array([solves]), "time")
+    assert list(formatted[0]) == list(parse_solves(result, "best").values())
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("rank_type", ["best", "average"])
+def test_result_list_serializer(rank_type):
+    results = [
+        ResultFactory(
+            best=best,
+            average=average,
+            value2=1234,
+            value3=-1,
+            value4=6005,
+            value5=average,
+        )
+        for best, average in [(700, 900), (650, -1), (6005, 0)]
+    ]
+    context = {"rank_type": rank_type}
+
+    assert ResultSerializer(results, many=True, context=context).data == [
+        ResultSerializer(result, context=context).data for result in results
+    ]
+
+
+@pytest.mark.django_db
+def test_result_list_serializer_leaves_results_unchanged():
+    result = ResultFactory(
+        best=700, average=900, value2=1234, value3=-1, value4=6005, value5=900
+    )
+    best = ResultSerializer([result], many=True, context={"rank_type": "best"}).data
+    average = ResultSerializer(
+        [result], many=True, context={"rank_type": "average"}
+    ).data
+
+    assert (best[0]["value"], average[0]["value"]) == ("7.00", "9.00")
+    assert average[0] == ResultSerializer(result, context={"rank_type": "average"}).data
+    assert best[0] == ResultSerializer(result, context={"rank_type": "best"}).data
+    assert best[0]["solves"] != average[0]["solves"]
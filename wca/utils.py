@@ -1,22 +1,29 @@
+import zlib
 from datetime import timedelta
 
+import numpy as np
+
 DNF = -1
 DNS = -2
 NO_RESULT = 0
 
 # Events with Average of 5 calculation
-Ao5_EVENTS = [
-    "333",
-    "222",
-    "444",
-    "555",
-    "333oh",
-    "clock",
-    "minx",
-    "pyram",
-    "skewb",
-    "sq1",
-]
+Ao5_EVENTS = frozenset(
+    [
+        "333",
+        "222",
+        "444",
+        "555",
+        "333oh",
+        "clock",
+        "minx",
+        "pyram",
+        "skewb",
+        "sq1",
+    ]
+)
+# Events with Mean of 3 calculation
+Mo3_EVENTS = frozenset(["666", "777", "333fm", "333bf", "444bf", "555bf"])
 
 
 def parse_time(value, hide_ms=False):
@@ -95,14 +102,16 @@ def parse_value(value, format, rank_type="best"):
                 return f"{solved}/{total} {time}"
 
 
-def parse_solves(result, rank_type):
-    if (
-        rank_type == "average"
-        and result.average != DNF
-        and result.event.id in Ao5_EVENTS
-    ):
-        return parse_ao5_solves(result)
-    format_type = result.event.format
+def parse_solves(result, rank_type, event=None):
+    """
+    Formatted solves of a result. ``event`` can be anything with the ``id``
+    and ``format`` of the event, such as an ``EventInfo``, so that
+    ``result.event`` is not loaded.
+    """
+    event = event or result.event
+    if rank_type == "average" and result.average != DNF and event.id in Ao5_EVENTS:
+        return parse_ao5_solves(result, event)
+    format_type = event.format
     return {
         "value1": parse_value(result.value1, format_type),
         "value2": parse_value(result.value2, format_type),
@@ -112,8 +121,9 @@ def parse_solves(result, rank_type):
     }
 
 
-def parse_ao5_solves(result):
+def parse_ao5_solves(result, event=None):
     """ Average of 5 solves """
+    event = event or result.event
     solves = [
         result.value1,
         result.value2,
@@ -135,7 +145,7 @@ def parse_ao5_solves(result):
     min_removed = False
     max_removed = False
     for index, solve in enumerate(solves):
-        value = parse_value(solve, result.event.format)
+        value = parse_value(solve, event.format)
         if solve == min_solve and not min_removed:
             solves[index] = f"({value})"
             min_removed = True
@@ -145,3 +155,165 @@ def parse_ao5_solves(result):
         else:
             solves[index] = value
     return {f"value{index+1}": solve for index, solve in enumerate(solves)}
+
+
+# Batch formatting of whole columns of values, with the same output as the
+# scalar functions above. Strings are built from lookup tables with object
+# array concatenation, so there is no Python call per value.
+_NUMBERS = np.array([f"{number:d}" for number in range(100)], dtype=object)
+_PADDED_NUMBERS = np.array([f"{number:02d}" for number in range(100)], dtype=object)
+_CENTISECONDS = "." + _PADDED_NUMBERS
+
+
+def _to_strings(values):
+    return np.asarray(values).astype(str).astype(object)
+
+
+def format_times(centiseconds, hide_ms=False):
+    """ ``parse_time`` of an array of centiseconds """
+    centiseconds = np.asarray(centiseconds, dtype=np.int64)
+    total_seconds, centis = np.divmod(centiseconds, 100)
+    # timedelta.seconds leaves out whole days
+    minutes, seconds = np.divmod(total_seconds % (24 * 60 * 60), 60)
+    hours, minutes = np.divmod(minutes, 60)
+
+    head = np.where(hours > 0, _NUMBERS[hours], "")
+    head = head + np.where((hours > 0) & (minutes > 0), ":", "")
+    head = head + np.where(minutes > 0, _NUMBERS[minutes], "")
+
+    tail = np.where(minutes > 0, _PADDED_NUMBERS[seconds], _NUMBERS[seconds])
+    if hide_ms:
+        tail = np.where(seconds > 0, tail, "00")
+    else:
+        fraction = np.where(minutes > 0, "00.", "0.") + _NUMBERS[centis]
+        tail = np.where(
+            seconds > 0,
+            tail + _CENTISECONDS[centis],
+            np.where(centis > 0, fraction, ""),
+        )
+
+    return head + np.where((head != "") & (tail != ""), ":", "") + tail
+
+
+def format_multi(values):
+    """ ``parse_value`` of an array of positive multi-blind values """
+    values = np.asarray(values, dtype=np.int64)
+    formatted = np.full(len(values), None, dtype=object)
+
+    # New format: 0DDTTTTTMM
+    new = (values >= 10**8) & (values < 10**9)
+    seconds = values // 100 % 100_000
+    new &= (seconds > 0) & (seconds != 99_999)
+    missed = values[new] % 100
+    solved = 99 - values[new] // 10**7 + missed
+    formatted[new] = (
+        _to_strings(solved)
+        + "/"
+        + _to_strings(solved + missed)
+        + " "
+        + format_times(seconds[new] * 100, hide_ms=True)
+    )
+
+    # Old format: 1SSAATTTTT, with the time read from the overlapping digits
+    # the same way as parse_value
+    old = (values >= 10**9) & (values < 2 * 10**9)
+    seconds = values // 1000 % 100_000
+    old &= (seconds > 0) & (seconds != 99_999)
+    formatted[old] = (
+        _to_strings(99 - values[old] // 10**7 % 100)
+        + "/"
+        + _to_strings(values[old] // 10**5 % 100)
+        + " "
+        + format_times(seconds[old], hide_ms=True)
+    )
+    return formatted
+
+
+def format_values(values, format, rank_type="best"):
+    """
+    ``parse_value`` of an array of values of an event format, as an object
+    array of strings, with None for no result.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    formatted = np.full(len(values), None, dtype=object)
+    valid = (values != DNF) & (values != DNS) & (values != NO_RESULT)
+
+    if format == "time":
+        formatted[valid] = format_times(values[valid])
+    elif format == "number" and rank_type == "average":
+        formatted[valid] = _to_strings(values[valid] / 100)
+    elif format == "number":
+        formatted[valid] = _to_strings(values[valid])
+    elif format == "multi":
+        formatted[valid] = format_multi(values[valid])
+
+    formatted[values == DNF] = "DNF"
+    formatted[values == DNS] = "DNS"
+    return formatted
+
+
+def get_ao5_trimmed(solves):
+    """
+    Boolean mask of the best and worst solve of each row of an ``(n, 5)``
+    array, as put in parentheses by ``parse_ao5_solves``.
+    """
+    solves = np.asarray(solves, dtype=np.int64)
+    rows = np.arange(len(solves))
+    min_solves = solves.min(axis=1)
+    max_solves = solves.max(axis=1)
+
+    # Like parse_ao5_solves, a DNF or DNS counts as the worst solve, and the
+    # best solve is then looked for without the solve at index DNF or DNS
+    incomplete = (min_solves == DNF) | (min_solves == DNS)
+    max_solves[incomplete] = min_solves[incomplete]
+    complete_solves = solves[incomplete].copy()
+    complete_solves[rows[: incomplete.sum()], min_solves[incomplete] % 5] = np.iinfo(
+        np.int64
+    ).max
+    min_solves[incomplete] = complete_solves.min(axis=1)
+
+    trimmed = np.zeros(solves.shape, dtype=bool)
+    min_indexes = (solves == min_solves[:, None]).argmax(axis=1)
+    trimmed[rows, min_indexes] = True
+    is_max = solves == max_solves[:, None]
+    is_max[rows, min_indexes] = False
+    has_max = is_max.any(axis=1)
+    trimmed[rows[has_max], is_max.argmax(axis=1)[has_max]] = True
+    return trimmed
+
+
+def format_solves(solves, format, ao5=None):
+    """
+    ``parse_solves`` of an ``(n, 5)`` array of solves as an object array of
+    the same shape. ``ao5`` marks the rows whose trimmed solves are put in
+    parentheses.
+    """
+    solves = np.asarray(solves, dtype=np.int64)
+    formatted = format_values(solves.ravel(), format).reshape(solves.shape)
+    if ao5 is not None and ao5.any():
+        trimmed = np.zeros(solves.shape, dtype=bool)
+        trimmed[ao5] = get_ao5_trimmed(solves[ao5])
+        formatted[trimmed] = "(" + _to_strings(formatted[trimmed]) + ")"
+    return formatted
+
+
+# Preset dictionary for scramble compression, made of common notation so that
+# even short scrambles compress. Stored scrambles depend on it, so it must
+# never change.
+SCRAMBLE_ZDICT = (
+    b"R++ R-- D++ D-- U U' y2 / (0,0) (1,0) (0,-1) (-1,0) (0,1) "
+    b"UR1+ DR2- DL3+ UL4- U5+ R6- D1+ L2- ALL3+ UR DR DL UL "
+    b"Rw Rw' Rw2 Lw Lw' Lw2 Uw Uw' Uw2 Dw Dw' Dw2 Fw Fw' Fw2 Bw Bw' Bw2 "
+    b"3Rw 3Uw 3Fw r r' l l' u u' b b' x x' y y' z z' "
+    b"R R' R2 L L' L2 U U' U2 D D' D2 F F' F2 B B' B2 "
+)
+
+
+def compress_scramble(scramble):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=SCRAMBLE_ZDICT)
+    return compressor.compress(scramble.encode()) + compressor.flush()
+
+
+def decompress_scramble(data):
+    decompressor = zlib.decompressobj(-15, zdict=SCRAMBLE_ZDICT)
+    return (decompressor.decompress(bytes(data)) + decompressor.flush()).decode()